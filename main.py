@@ -16,30 +16,22 @@ def main():
     # Reactivar logging para ver errores reales
     logging.disable(logging.NOTSET)
 
-    logger.info(f"Iniciando bot en modo: {settings['env']}")
-    logger.info(f"Endpoint: {settings['rest_endpoint']}")
+    logger.info("Iniciando bot en modo: %s", settings['env'])
+    logger.info("Endpoint: %s", settings['rest_endpoint'])
 
-    # Initialize client
-    client = BybitClient(
-        api_key=settings["api_key"],
-        api_secret=settings["api_secret"],
-        rest_endpoint=settings["rest_endpoint"],
-        account_type=settings["account_type"],
-        is_testnet=settings["is_testnet"],
-        is_demo=settings["is_demo"],
-    )
+    # Initialize client (credenciales y endpoint salen de load_settings())
+    client = BybitClient(default_coins=("USDT",))
 
-    # Validar conexión ESTRICTA
-    try:
-        logger.info("Probando conexión a API...")
-        balances = client.get_wallet_balance(coins=["USDT"])
-        logger.info(f"✅ Conexión exitosa. Balance USDT: {balances.get('USDT', 0)}")
-    except Exception as e:
-        logger.error(f"❌ ERROR CRÍTICO DE CONEXIÓN: {e}")
-        logger.error("Verifica tus API KEYS en el archivo .env y que correspondan a TESTNET/MAINNET")
+    # Solo conectividad (hora del servidor, sin autenticación): aquí NO se verifican las claves API ni que
+    # BYBIT_ENV sea el correcto; un error de credenciales aparecerá en la primera llamada autenticada
+    logger.info("Probando conectividad con la API (sin verificar credenciales)...")
+    if not client.ping():
+        logger.error("❌ ERROR CRÍTICO DE CONEXIÓN: la API de Bybit no responde")
+        logger.error("Verifica tu conexión a Internet y el endpoint configurado (%s)", settings['rest_endpoint'])
         logger.error("El bot se detendrá para evitar errores en bucle.")
         time.sleep(5) # Dar tiempo a leer el log
         return # Salir limpiamente
+    logger.info("✅ API accesible. Las credenciales no se verifican al arrancar (usa test_connection.py para comprobarlas).")
 
     streamer = MarketDataStreamer(client, settings["symbol"], settings["category"])
     order_manager = OrderManager(client, settings["symbol"], settings["category"])
@@ -62,7 +54,11 @@ def main():
     )
     
     logger.info("🚀 Estrategia iniciada. Presiona Ctrl+C para detener.")
-    strat.run()
+    try:
+        strat.run()
+    finally:
+        order_manager.close()
+        client.close()
 
 if __name__ == "__main__":
     main()
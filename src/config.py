@@ -1,19 +1,36 @@
 import os
+import re
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Cargar variables de entorno desde .env
 load_dotenv()
 
+# (REST, WebSocket) por entorno; cualquier otro valor usa los endpoints de producción
+_ENDPOINTS = {
+    "DEMO": ("https://api-demo.bybit.com", "wss://stream.bybit.com"),
+    "TESTNET": ("https://api-testnet.bybit.com", "wss://stream-testnet.bybit.com"),
+    "PROD": ("https://api.bybit.com", "wss://stream.bybit.com"),
+}
+
+_STRIP_RE = re.compile(r'^[\s"\']+|[\s"\']+$')
+
+def _clean(value: str) -> str:
+    """Quita espacios y comillas sobrantes de un valor leído del .env."""
+    return _STRIP_RE.sub("", value or "")
+
+@lru_cache(maxsize=1)
 def load_settings():
-    env = os.getenv("BYBIT_ENV", "DEMO").strip().strip('"').strip("'").upper()
+    env = _clean(os.getenv("BYBIT_ENV", "DEMO")).upper()
     is_demo = env == "DEMO"
     is_testnet = env == "TESTNET"
     is_prod = env == "PROD"
-    buy_usdt_amount = os.getenv("BUY_USDT_AMOUNT", "").strip().strip('"').strip("'")
+    buy_usdt_amount = _clean(os.getenv("BUY_USDT_AMOUNT", ""))
+    rest_endpoint, ws_endpoint = _ENDPOINTS.get(env, _ENDPOINTS["PROD"])
 
     settings = {
-        "api_key": os.getenv("BYBIT_API_KEY", "").strip().strip('"').strip("'"),
-        "api_secret": os.getenv("BYBIT_API_SECRET", "").strip().strip('"').strip("'"),
+        "api_key": _clean(os.getenv("BYBIT_API_KEY", "")),
+        "api_secret": _clean(os.getenv("BYBIT_API_SECRET", "")),
         "account_type": os.getenv("BYBIT_ACCOUNT_TYPE", "UNIFIED"),
         "symbol": os.getenv("SYMBOL", "BTCUSDT"),
         "category": os.getenv("CATEGORY", "spot"),
@@ -23,15 +40,13 @@ def load_settings():
         "is_testnet": is_testnet,
         "is_prod": is_prod,
         "buy_usdt_amount": buy_usdt_amount,
-        "rest_endpoint": (
-            "https://api-demo.bybit.com" if is_demo else (
-                "https://api-testnet.bybit.com" if is_testnet else "https://api.bybit.com"
-            )
-        ),
-        "ws_endpoint": (
-            "wss://stream.bybit.com" if is_demo else (
-                "wss://stream-testnet.bybit.com" if is_testnet else "wss://stream.bybit.com"
-            )
-        ),
+        "rest_endpoint": rest_endpoint,
+        "ws_endpoint": ws_endpoint,
     }
-    return settings
\ No newline at end of file
+    return settings
+
+def __getattr__(name):
+    # SETTINGS se construye solo cuando alguien lo importa (PEP 562)
+    if name == "SETTINGS":
+        return load_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,65 +1,262 @@
-from pybit.unified_trading import HTTP
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_FLOOR, ROUND_HALF_UP
+from functools import lru_cache, wraps
+from src.config import load_settings
 from src.logger import logger
 
+# Sesiones HTTP compartidas entre instancias para reutilizar conexiones (TCP + TLS)
+_HTTP_CACHE = {}
+
+# Los filtros del símbolo cambian muy rara vez: se cachean por (symbol, category)
+_FILTERS_TTL = 300.0
+_FILTERS_ERROR_TTL = 30.0
+# Antigüedad máxima del precio recibido por el stream para usarlo en lugar del ticker REST
+_PRICE_MAX_AGE = 1.0
+# Rechazos de orden que indican que los filtros cacheados pueden estar desactualizados
+_FILTER_REJECT_CODES = {170136, 170140}
+
+# TCP keepalive en las conexiones del pool para que sigan sanas entre consultas espaciadas
+# (p.ej. el polling de respaldo, una vez por minuto). Las constantes que no existan en el SO se omiten.
+_KEEPALIVE_OPTS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4))
+    if hasattr(socket, name)
+]
+
+def _get_http(rest_endpoint, api_key, api_secret, is_testnet, is_demo):
+    """Devuelve la sesión HTTP cacheada para estas credenciales, creándola si no existe."""
+    key = (rest_endpoint, api_key, is_testnet, is_demo)
+    http = _HTTP_CACHE.get(key)
+    if http is None:
+        # pybit arrastra requests, websocket-client, etc.: se importa solo al crear la primera sesión
+        from pybit.unified_trading import HTTP
+        from requests.adapters import HTTPAdapter
+        from urllib3.connection import HTTPConnection
+
+        class KeepAliveAdapter(HTTPAdapter):
+            def init_poolmanager(self, *args, **kwargs):
+                kwargs["socket_options"] = HTTPConnection.default_socket_options + _KEEPALIVE_OPTS
+                super().init_poolmanager(*args, **kwargs)
+
+        http = HTTP(
+            testnet=is_testnet,
+            demo=is_demo,
+            api_key=api_key,
+            api_secret=api_secret,
+            timeout=25,
+            recv_window=50000,
+        )
+        # Pool grande y sin bloqueo para que las consultas concurrentes no esperen conexión libre
+        http.client.mount("https://", KeepAliveAdapter(pool_connections=20, pool_maxsize=50, max_retries=0, pool_block=False))
+        http.client.headers["Connection"] = "keep-alive"
+        _HTTP_CACHE[key] = http
+    return http
+
+def _list(response):
+    """Extrae result.list de una respuesta de la API en una sola pasada."""
+    result = response.get("result")
+    return (result or {}).get("list") or []
+
+@lru_cache(maxsize=64)
+def _step_decimals(step: float) -> int:
+    """Decimales de un paso de cantidad/precio (0.001 -> 3). Se calcula una vez por paso."""
+    return max(0, -Decimal(repr(step)).normalize().as_tuple().exponent)
+
+@lru_cache(maxsize=64)
+def _step_dec(step: float) -> Decimal:
+    """Paso como Decimal exacto (0.005 -> Decimal('0.005')), creado una vez por paso."""
+    return Decimal(repr(step))
+
+def _fmt(value, step, rounding=ROUND_HALF_UP):
+    """
+    Formatea un número como múltiplo del paso del símbolo (por defecto al más cercano,
+    para precios); las cantidades pasan ROUND_FLOOR. Los str ya formateados pasan tal cual.
+    """
+    if isinstance(value, str):
+        return value
+    if not step or step <= 0:
+        return str(value)
+    step_dec = _step_dec(step)
+    snapped = (Decimal(repr(value)) / step_dec).to_integral_value(rounding=rounding) * step_dec
+    return f"{snapped:.{_step_decimals(step)}f}"
+
+def _freeze(value):
+    """Convierte listas en tuplas para poder usar los argumentos como clave de caché."""
+    return tuple(value) if isinstance(value, list) else value
+
+def _swr_cache(ttl, max_stale=None):
+    """
+    Cache stale-while-revalidate por instancia y argumentos.
+    Dentro del TTL devuelve el valor cacheado; pasado el TTL lo sigue devolviendo
+    mientras el pool de refresco del cliente lo actualiza. Si el valor es más viejo que
+    max_stale (10 x TTL por defecto) se vuelve a pedir de forma síncrona. Los resultados
+    vacíos no se cachean, ni los de consultas que empezaron antes de un _invalidate_cached.
+    """
+    if max_stale is None:
+        max_stale = ttl * 10
+
+    def decorator(fn):
+        name = fn.__name__
+
+        def store(self, key, generation, value):
+            # Sello tomado tras la consulta; si hubo invalidación mientras tanto el valor se descarta
+            with self._swr_lock:
+                if self._swr_generations.get(name, 0) == generation:
+                    self._swr_entries[key] = [value, time.monotonic(), False]
+
+        def refresh(self, key, entry, generation, args, kwargs):
+            try:
+                value = fn(self, *args, **kwargs)
+            except Exception:
+                value = None
+            if value:
+                store(self, key, generation, value)
+                return
+            with self._swr_lock:
+                # Solo se libera la entrada que lanzó este refresco, no una posterior a una invalidación
+                if self._swr_entries.get(key) is entry:
+                    entry[2] = False
+
+        @wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            key = (name, tuple(_freeze(a) for a in args), tuple(sorted((k, _freeze(v)) for k, v in kwargs.items())))
+            entry = self._swr_entries.get(key)
+            generation = self._swr_generations.get(name, 0)
+            if entry is not None:
+                value, fetched_at, _ = entry
+                age = time.monotonic() - fetched_at
+                if age < ttl:
+                    return value
+                if age < max_stale:
+                    with self._swr_lock:
+                        # Comprobar y marcar a la vez: dos lecturas concurrentes lanzan un solo refresco
+                        if not entry[2] and self._swr_entries.get(key) is entry:
+                            entry[2] = True
+                            self._refresh_pool().submit(refresh, self, key, entry, generation, args, kwargs)
+                    return value
+
+            value = fn(self, *args, **kwargs)
+            if value:
+                store(self, key, generation, value)
+            return value
+
+        return wrapper
+    return decorator
+
 class BybitClient:
-    def __init__(self, api_key=None, api_secret=None, is_testnet=None, is_demo=None, rest_endpoint=None, account_type=None):
-        self.api_key = api_key if api_key is not None else BYBIT_API_KEY
-        self.api_secret = api_secret if api_secret is not None else BYBIT_API_SECRET
-        self.is_testnet = is_testnet if is_testnet is not None else BYBIT_TESTNET
-        self.is_demo = is_demo if is_demo is not None else BYBIT_DEMO
+    __slots__ = ("api_key", "api_secret", "is_testnet", "is_demo", "account_type", "default_coins", "http",
+                 "_coins_csv", "_coins_set", "_filters_cache", "_swr_entries", "_swr_generations", "_swr_lock", "_swr_pool",
+                 "_price_cache")
+
+    def __init__(self, api_key=None, api_secret=None, is_testnet=None, is_demo=None, rest_endpoint=None, account_type=None, default_coins=()):
+        # Los valores no indicados salen de la configuración (.env)
+        settings = load_settings()
+        self.api_key = api_key if api_key is not None else settings["api_key"]
+        self.api_secret = api_secret if api_secret is not None else settings["api_secret"]
+        self.is_testnet = is_testnet if is_testnet is not None else settings["is_testnet"]
+        self.is_demo = is_demo if is_demo is not None else settings["is_demo"]
+        self.account_type = account_type or settings["account_type"]
+        self.default_coins = tuple(default_coins)
+        self._coins_csv = ",".join(self.default_coins) or None
+        self._coins_set = frozenset(self.default_coins)
+        rest_endpoint = rest_endpoint or settings["rest_endpoint"]
+        self._filters_cache = {}
+        self._swr_entries = {}
+        self._swr_generations = {}  # nombre del método -> nº de invalidaciones
+        self._swr_lock = threading.Lock()
+        self._swr_pool = None  # refrescos en segundo plano; se crea con el primero (ver close)
+        self._price_cache = {}  # (category, symbol) -> (instante monotónico, último precio) que envía el streamer
         
-        logger.info(f"Inicializando BybitClient - Testnet: {self.is_testnet}, Demo: {self.is_demo}")
+        logger.info("Inicializando BybitClient - Testnet: %s, Demo: %s", self.is_testnet, self.is_demo)
         
         try:
-            self.http = HTTP(
-                testnet=self.is_testnet,
-                demo=self.is_demo,
-                api_key=self.api_key,
-                api_secret=self.api_secret,
-                timeout=25,
-                recv_window=50000,
-            )
+            self.http = _get_http(rest_endpoint, self.api_key, self.api_secret, self.is_testnet, self.is_demo)
             logger.info("Cliente HTTP de Bybit inicializado correctamente")
         except Exception as e:
-            logger.error(f"Error al inicializar cliente HTTP de Bybit: {e}")
+            logger.error("Error al inicializar cliente HTTP de Bybit: %s", e)
             raise
 
+    def _refresh_pool(self) -> ThreadPoolExecutor:
+        """Pool de refrescos stale-while-revalidate; se llama con _swr_lock tomado."""
+        if self._swr_pool is None:
+            self._swr_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="swr-refresh")
+        return self._swr_pool
+
+    def close(self):
+        """Detiene el pool de refrescos: los pendientes se cancelan y los que están en curso terminan solos."""
+        with self._swr_lock:
+            pool, self._swr_pool = self._swr_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def ping(self) -> bool:
+        """Comprobación ligera de conectividad: hora del servidor, sin autenticación ni reintentos."""
+        try:
+            response = self.http.get_server_time()
+            return response.get('retCode') == 0
+        except Exception as e:
+            logger.error("Excepción al consultar la hora del servidor: %s", e)
+            return False
+
+    # El balance dimensiona las órdenes y lo cambian fills que no pasan por place_order
+    # (TP/SL, operaciones manuales) y no lo invalidan: como mucho 15 s de antigüedad
+    @_swr_cache(ttl=10.0, max_stale=15.0)
     def get_wallet_balance(self, coins=None):
+        # Sin 'coins' (o con las monedas por defecto) se reutilizan la lista y el set precalculados
+        if coins is None or tuple(coins) == self.default_coins:
+            coins_csv, wanted = self._coins_csv, self._coins_set
+        else:
+            coins_csv, wanted = ",".join(coins), frozenset(coins)
         try:
-            response = self.http.get_wallet_balance(accountType="UNIFIED", coin=",".join(coins) if coins else None)
+            response = self.http.get_wallet_balance(accountType=self.account_type, coin=coins_csv)
             
             if response.get('retCode') != 0:
-                logger.error(f"Error de API al obtener balance: {response}")
+                logger.error("Error de API al obtener balance: %s", response)
                 return {}
                 
-            result = response.get('result', {})
-            list_accounts = result.get('list', [])
-            
-            balances = {}
-            if list_accounts:
-                account = list_accounts[0]
-                for coin_data in account.get('coin', []):
-                    coin_name = coin_data.get('coin')
-                    wallet_balance = float(coin_data.get('walletBalance', 0))
-                    balances[coin_name] = wallet_balance
-                    
-            return balances
+            list_accounts = _list(response)
+            if not list_accounts:
+                return {}
+
+            return {
+                c.get('coin'): float(c.get('walletBalance') or 0)
+                for c in list_accounts[0].get('coin', ())
+                if not wanted or c.get('coin') in wanted
+            }
 
         except Exception as e:
-            logger.error(f"Excepción al obtener balance: {e}")
+            logger.error("Excepción al obtener balance: %s", e)
             raise
 
+    def update_price(self, category, symbol, last_price: str):
+        """Lo llama el streamer con cada precio recibido (str, como lo envía Bybit); get_ticker lo sirve sin ir a la API."""
+        self._price_cache[(category, symbol)] = (time.monotonic(), last_price)
+
     def get_ticker(self, symbol, category="spot"):
-        """Obtiene el precio actual (ticker) de un símbolo."""
+        """
+        Obtiene el precio actual (ticker) de un símbolo: el del stream de esa categoría si es reciente,
+        si no vía REST. El del stream solo trae 'symbol' y 'lastPrice' (str, como REST); quien
+        necesite el resto de campos del ticker debe pedirlo a la API.
+        """
+        cached = self._price_cache.get((category, symbol))
+        if cached is not None and time.monotonic() - cached[0] < _PRICE_MAX_AGE:
+            return {"symbol": symbol, "lastPrice": cached[1]}
+        return self._fetch_ticker(symbol, category)
+
+    # El stale no puede pasar de _PRICE_MAX_AGE: un precio viejo mueve el SL/TP
+    @_swr_cache(ttl=0.5, max_stale=_PRICE_MAX_AGE)
+    def _fetch_ticker(self, symbol, category="spot"):
         try:
             response = self.http.get_tickers(category=category, symbol=symbol)
             
             if response.get('retCode') != 0:
-                logger.error(f"Error API al obtener ticker: {response}")
+                logger.error("Error API al obtener ticker: %s", response)
                 return None
                 
-            result = response.get('result', {})
-            list_tickers = result.get('list', [])
+            list_tickers = _list(response)
             
             if list_tickers:
                 # Retornamos el primer ticker de la lista
@@ -67,19 +264,43 @@ class BybitClient:
             return None
             
         except Exception as e:
-            logger.error(f"Excepción al obtener ticker: {e}")
+            logger.error("Excepción al obtener ticker: %s", e)
+            return None
+
+    def get_klines(self, symbol, category="spot", interval=1, limit=200):
+        """
+        Obtiene velas vía REST. Devuelve el bloque 'result' con 'list' ordenada
+        de la vela más reciente a la más antigua. Las excepciones de red se propagan.
+        """
+        response = self.http.get_kline(category=category, symbol=symbol, interval=str(interval), limit=limit)
+        if response.get('retCode') != 0:
+            logger.error("Error API al obtener klines: %s", response)
             return None
+        return {"list": _list(response)}
 
     def get_symbol_filters(self, symbol, category="spot"):
         """Obtiene filtros del símbolo (decimales de precio, cantidad mínima, etc)."""
+        key = (symbol, category)
+        cached = self._filters_cache.get(key)
+        now = time.monotonic()
+        if cached is not None:
+            fetched_at, filters = cached
+            ttl = _FILTERS_TTL if filters is not None else _FILTERS_ERROR_TTL
+            if now - fetched_at < ttl:
+                return filters
+
+        filters = self._fetch_symbol_filters(symbol, category)
+        self._filters_cache[key] = (now, filters)
+        return filters
+
+    def _fetch_symbol_filters(self, symbol, category):
         try:
             response = self.http.get_instruments_info(category=category, symbol=symbol)
             if response.get("retCode") != 0:
-                logger.error(f"Error obteniendo info de instrumento: {response}")
+                logger.error("Error obteniendo info de instrumento: %s", response)
                 return None
             
-            result = response.get("result", {})
-            lista = result.get("list", [])
+            lista = _list(response)
             if not lista:
                 return None
             
@@ -97,20 +318,28 @@ class BybitClient:
                 "max_price": float(price_filter.get("maxPrice", 0)),
             }
         except Exception as e:
-            logger.error(f"Excepción obteniendo filtros: {e}")
+            logger.error("Excepción obteniendo filtros: %s", e)
             return None
 
+    def invalidate_filters(self, symbol, category="spot"):
+        """Fuerza a que la próxima consulta de filtros (y del mínimo de orden) vaya a la API."""
+        self._filters_cache.pop((symbol, category), None)
+
+    def filters_cached(self, symbol, category="spot") -> bool:
+        """True mientras los filtros del símbolo sigan en caché (un rechazo por filtros los descarta)."""
+        return (symbol, category) in self._filters_cache
+
     def get_min_order_value(self, symbol, category="spot"):
         """
         Obtiene el valor mínimo de orden (minNotional o minOrderAmt) para el símbolo.
-        Útil para validar compras Market en USDT.
+        Útil para validar compras Market en USDT. Sale de los filtros cacheados, sin REST extra.
         """
         filters = self.get_symbol_filters(symbol, category)
         if filters:
             return filters.get("min_notional", 0.0)
         return 0.0
 
-    def place_order(self, category, symbol, side, order_type, qty=None, price=None, time_in_force="GTC", stop_loss=None, take_profit=None, **kwargs):
+    def place_order(self, category, symbol, side, order_type, qty=None, price=None, time_in_force="GTC", stop_loss=None, take_profit=None, order_link_id=None, **kwargs):
         try:
             order_params = {
                 "category": category,
@@ -119,31 +348,90 @@ class BybitClient:
                 "orderType": order_type,
                 "timeInForce": time_in_force,
             }
-            if qty:
-                order_params["qty"] = str(qty)
-            if price:
-                order_params["price"] = str(price)
-            if stop_loss:
-                order_params["stopLoss"] = str(stop_loss)
-            if take_profit:
-                order_params["takeProfit"] = str(take_profit)
-            
+            # Campos opcionales: solo se envían los que tienen valor
+            optional = {
+                "qty": qty,
+                "price": price,
+                "stopLoss": stop_loss,
+                "takeProfit": take_profit,
+                "orderLinkId": order_link_id,
+            }
+            order_params.update({k: self._format_field(k, v, symbol, category) for k, v in optional.items() if v})
+
             # Agregar cualquier otro parámetro extra (marketUnit, quoteOrderQty, etc.)
             order_params.update(kwargs)
 
-            logger.info(f"Enviando orden: {order_params}")
+            logger.info("Enviando orden: %s", order_params)
             response = self.http.place_order(**order_params)
 
             # Si hay un error en la respuesta de la API, lo registramos de forma clara
             if response.get('retCode') != 0:
-                logger.error(f"Error de API al enviar orden: {response.get('retMsg')} (retCode: {response.get('retCode')})")
+                logger.error("Error de API al enviar orden: %s (retCode: %s)", response.get('retMsg'), response.get('retCode'))
+                if response.get('retCode') in _FILTER_REJECT_CODES:
+                    self.invalidate_filters(symbol, category)
+            else:
+                # La orden cambia el balance: la próxima consulta debe ir a la API
+                self._invalidate_cached("get_wallet_balance")
             
             return response
         except Exception as e:
-            logger.error(f"Excepción al enviar orden: {e}")
+            logger.error("Excepción al enviar orden: %s", e)
             # Devolvemos un diccionario con el error para un manejo consistente
             return {"retCode": -1, "retMsg": str(e)}
 
+    def place_orders_batch(self, category, orders):
+        """
+        Envía varias órdenes en una sola petición (/v5/order/create-batch).
+        Cada orden usa las claves de la API (symbol, side, orderType, qty, ...); los números
+        se formatean al qtyStep/tickSize del símbolo. Bybit admite hasta 10 órdenes por lote.
+        """
+        try:
+            request = []
+            for order in orders:
+                symbol = order["symbol"]
+                request.append({
+                    k: self._format_field(k, v, symbol, category) if k in ("qty", "price", "stopLoss", "takeProfit") else v
+                    for k, v in order.items() if v is not None
+                })
+
+            logger.info("Enviando lote de %d órdenes", len(request))
+            response = self.http.place_batch_order(category=category, request=request)
+
+            if response.get('retCode') != 0:
+                logger.error("Error de API al enviar lote: %s (retCode: %s)", response.get('retMsg'), response.get('retCode'))
+                return response
+
+            # Cada orden del lote trae su propio código en retExtInfo.list
+            statuses = (response.get("retExtInfo") or {}).get("list") or []
+            for order, status in zip(request, statuses):
+                code = status.get("code")
+                if code:
+                    logger.error("Orden del lote rechazada: %s (code: %s)", status.get("msg"), code)
+                    if code in _FILTER_REJECT_CODES:
+                        self.invalidate_filters(order["symbol"], category)
+            self._invalidate_cached("get_wallet_balance")
+            return response
+        except Exception as e:
+            logger.error("Excepción al enviar lote de órdenes: %s", e)
+            return {"retCode": -1, "retMsg": str(e)}
+
+    def _format_field(self, field, value, symbol, category):
+        """Los valores numéricos se formatean al qtyStep/tickSize del símbolo; los str se envían sin tocar."""
+        if isinstance(value, str) or field == "orderLinkId":
+            return str(value)
+        filters = self.get_symbol_filters(symbol, category) or {}
+        if field == "qty":
+            # Hacia abajo: redondear al más cercano podría pedir más de lo que hay en balance
+            return _fmt(value, filters.get("qty_step"), ROUND_FLOOR)
+        return _fmt(value, filters.get("price_tick"))
+
+    def _invalidate_cached(self, name):
+        """Descarta las entradas stale-while-revalidate de un método y las consultas en vuelo."""
+        with self._swr_lock:
+            self._swr_generations[name] = self._swr_generations.get(name, 0) + 1
+            for key in [k for k in list(self._swr_entries) if k[0] == name]:
+                self._swr_entries.pop(key, None)
+
     def get_executions(self, symbol: str, category: str = "spot", orderId: str = None, limit: int = 50):
         try:
             params = {"category": category, "symbol": symbol, "limit": limit}
@@ -151,5 +439,5 @@ class BybitClient:
                 params["orderId"] = orderId
             return self.http.get_executions(**params)
         except Exception as e:
-            logger.error(f"Error en get_executions: {e}")
+            logger.error("Error en get_executions: %s", e)
             return {}
@@ -1,6 +1,34 @@
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Un QueueListener por tipo de log: los loggers solo encolan y un hilo aparte escribe en consola/disco
+_QUEUE_HANDLERS = {}
+_QUEUE_LOCK = threading.Lock()
+_DIRS_READY = False
+
+def _ensure_dirs():
+    """Crea el directorio de logs una sola vez por proceso."""
+    global _DIRS_READY
+    if not _DIRS_READY:
+        os.makedirs("logs", exist_ok=True)
+        _DIRS_READY = True
+
+def _get_queue_handler(kind: str, build_handlers):
+    with _QUEUE_LOCK:
+        handler = _QUEUE_HANDLERS.get(kind)
+        if handler is None:
+            _ensure_dirs()
+            q = queue.Queue(-1)
+            listener = QueueListener(q, *build_handlers(), respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)  # vaciar la cola al salir
+            handler = QueueHandler(q)
+            _QUEUE_HANDLERS[kind] = handler
+        return handler
 
 def setup_logger(name: str, level: str = "INFO"):
     # --- Bloque para borrar logs antiguos ---
@@ -27,23 +55,23 @@ def setup_logger(name: str, level: str = "INFO"):
         return logger  # prevent duplicate handlers in repeated calls
 
     logger.setLevel(getattr(logging, level.upper(), logging.INFO))
-    os.makedirs("logs", exist_ok=True)
 
-    fmt = logging.Formatter(
-        "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    def build_handlers():
+        fmt = logging.Formatter(
+            "%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
-    # Console
-    ch = logging.StreamHandler()
-    ch.setFormatter(fmt)
-    logger.addHandler(ch)
+        # Console
+        ch = logging.StreamHandler()
+        ch.setFormatter(fmt)
 
-    # Rotating file
-    fh = RotatingFileHandler("logs/bot.log", maxBytes=2_000_000, backupCount=3)
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+        # Rotating file
+        fh = RotatingFileHandler("logs/bot.log", maxBytes=2_000_000, backupCount=3)
+        fh.setFormatter(fmt)
+        return ch, fh
 
+    logger.addHandler(_get_queue_handler("bot", build_handlers))
     return logger
 
 def setup_trade_logger(name: str = "Trades"):
@@ -52,25 +80,25 @@ def setup_trade_logger(name: str = "Trades"):
         return logger  # evitar duplicados
 
     logger.setLevel(logging.INFO)
-    os.makedirs("logs", exist_ok=True)
 
-    # Formato “bonito” solo para operaciones
-    fmt = logging.Formatter(
-        "%(asctime)s | TRADE | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    def build_handlers():
+        # Formato “bonito” solo para operaciones
+        fmt = logging.Formatter(
+            "%(asctime)s | TRADE | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
-    # Consola solo con trades
-    ch = logging.StreamHandler()
-    ch.setFormatter(fmt)
-    logger.addHandler(ch)
+        # Consola solo con trades
+        ch = logging.StreamHandler()
+        ch.setFormatter(fmt)
 
-    # Asegurar que el archivo exista
-    trade_log_path = "logs/trades.log"
-    fh = RotatingFileHandler(trade_log_path, maxBytes=5_000_000, backupCount=5)
-    fh.setFormatter(fmt)
-    logger.addHandler(fh)
+        # El archivo se abre (y se crea) con la primera operación registrada
+        trade_log_path = "logs/trades.log"
+        fh = RotatingFileHandler(trade_log_path, maxBytes=5_000_000, backupCount=5, delay=True)
+        fh.setFormatter(fmt)
+        return ch, fh
 
+    logger.addHandler(_get_queue_handler("trades", build_handlers))
     return logger
 
 # INSTANCIA GLOBAL (para que 'from src.logger import logger' funcione)
@@ -1,51 +1,279 @@
+import json
+import logging
+import queue
 import threading
 import time
+import random
 import sys
-from typing import Optional, Callable, Dict
+from collections import namedtuple
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Optional, Callable, Dict, Tuple
 from pybit.unified_trading import WebSocket
+import pybit._websocket_stream as _pybit_ws
 from src.logger import setup_logger
 from src.exchange.bybit_client import BybitClient
+from src.utils import fast_json
+
+# Cada frame del WS pasa por json.loads en el hilo lector de pybit: usar orjson si está disponible
+fast_json.install(_pybit_ws)
+
+# Solo se usan diferencias de tiempo: reloj monotónico, enlazado como global
+_monotonic = time.monotonic
 
 # --- Custom Hook para silenciar errores ruidosos de WebSocket ---
-_original_thread_excepthook = threading.excepthook
+# Tipo resuelto una vez (websocket-client es dependencia de pybit); sin él se compara por nombre
+try:
+    from websocket import WebSocketConnectionClosedException as _WSClosedError
+except ImportError:
+    _WSClosedError = None
+
+def _is_ws_closed_error(exc_type, exc_value) -> bool:
+    if _WSClosedError is not None:
+        return exc_type is not None and issubclass(exc_type, _WSClosedError)
+    exc_type_name = exc_type.__name__ if exc_type else ""
+    return "WebSocketConnectionClosedException" in exc_type_name or "Connection is already closed" in str(exc_value)
+
+# Si el módulo se recarga, encadenar con el hook original y no con nuestra versión anterior
+_original_thread_excepthook = getattr(threading.excepthook, "_mdstream_original", threading.excepthook)
 _last_ws_error_ts = 0
-_is_ws_down = False
+_ws_down_event = threading.Event()  # visible entre hilos sin escrituras 'global'
 
 def _silent_ws_excepthook(args):
     """
     Captura excepciones de hilos. Si es WebSocketConnectionClosedException,
     imprime un mensaje limpio en lugar del traceback gigante.
     """
-    global _last_ws_error_ts, _is_ws_down
-    exc_msg = str(args.exc_value)
-    exc_type_name = args.exc_type.__name__ if args.exc_type else ""
-    
-    if "WebSocketConnectionClosedException" in exc_type_name or "Connection is already closed" in exc_msg:
+    global _last_ws_error_ts
+    if _is_ws_closed_error(args.exc_type, args.exc_value):
         # Solo avisar si es la primera vez que detectamos la caída
-        if not _is_ws_down:
+        if not _ws_down_event.is_set():
             timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
             print(f"{timestamp} | WARNING | MarketDataStreamer | SE PERDIÓ LA CONEXIÓN WEBSOCKET. Activando protecciones y modo respaldo...")
-            _is_ws_down = True
-            _last_ws_error_ts = time.time()
+            _ws_down_event.set()
+            _last_ws_error_ts = _monotonic()
     else:
         _original_thread_excepthook(args)
 
+_silent_ws_excepthook._mdstream_original = _original_thread_excepthook
 threading.excepthook = _silent_ws_excepthook
 # ----------------------------------------------------------------
 
+@lru_cache(maxsize=256)
+def _parse_price(value: str) -> float:
+    """float() memoizado: los precios de un símbolo se repiten mucho entre velas."""
+    return float(value)
+
+# Vela inmutable y ligera (sin dict por mensaje)
+Kline = namedtuple("Kline", "timestamp open high low close volume")
+
+def _kline_from_ws(row: Dict) -> Kline:
+    """Convierte una vela del WebSocket ({'start','open',...}) en Kline."""
+    return Kline(
+        int(row['start']),
+        _parse_price(row['open']),
+        _parse_price(row['high']),
+        _parse_price(row['low']),
+        _parse_price(row['close']),
+        float(row['volume']),  # el volumen casi nunca se repite: sin caché
+    )
+
+def _kline_from_rest(row) -> Kline:
+    """Convierte una fila REST [start, open, high, low, close, volume, ...] en Kline."""
+    return Kline(
+        int(row[0]),
+        _parse_price(row[1]),
+        _parse_price(row[2]),
+        _parse_price(row[3]),
+        _parse_price(row[4]),
+        float(row[5]),
+    )
+
+# Polling de respaldo alineado al minuto: margen tras el cierre y reintento si la vela aún no aparece
+_POLL_CLOSE_DELAY_SECS = 1.5
+_POLL_RETRY_SECS = 5.0
+
+# Las velas en tiempo real salen del canal público spot, sea cual sea la categoría de las órdenes
+_WS_CHANNEL = "spot"
+
+class _SharedWebSocket(WebSocket):
+    """
+    WebSocket de pybit compartido por varios streamers. pybit no acepta callbacks
+    on_open/on_close/on_error, así que se reenvían sus eventos a los streamers registrados.
+    Las altas y bajas de topics las hace un hilo propio: ni el hilo lector de pybit ni
+    quien tenga _topics_lock esperan nunca a la red.
+    """
+    def __init__(self, **kwargs):
+        self.listeners = []  # antes de super(): pybit conecta (y llama a _on_open) dentro de __init__
+        # topic -> callbacks de los streamers: una sola suscripción en pybit por topic, repartida aquí
+        self.topics: Dict[str, tuple] = {}
+        self._topic_args: Dict[str, tuple] = {}  # topic -> (interval, symbol) para kline_stream
+        self._unsubscribing = set()  # bajas enviadas cuya confirmación aún no llegó
+        self._topics_lock = threading.Lock()
+        self._sync_queue = queue.SimpleQueue()
+        threading.Thread(target=self._sync_loop, name="mdstream-ws-sync", daemon=True).start()
+        super().__init__(**kwargs)
+
+    def _dispatch(self, message):
+        for callback in self.topics.get(message.get("topic"), ()):
+            callback(message)
+
+    def add_kline(self, interval: int, symbol: str, callback):
+        """Registra callback para las velas de symbol; espera a que el topic quede suscrito."""
+        topic = f"kline.{interval}.{symbol}"
+        with self._topics_lock:
+            self.topics[topic] = self.topics.get(topic, ()) + (callback,)
+            self._topic_args[topic] = (interval, symbol)
+        try:
+            self._schedule(topic).result()
+        except Exception:
+            self._drop_callback(topic, callback)
+            raise
+
+    def remove_kline(self, interval: int, symbol: str, callback):
+        """Quita callback; con el último se da de baja el topic en Bybit (sin esperar)."""
+        topic = f"kline.{interval}.{symbol}"
+        if self._drop_callback(topic, callback):
+            self._schedule(topic)
+
+    def _drop_callback(self, topic: str, callback) -> bool:
+        """Devuelve True si era el último callback del topic."""
+        with self._topics_lock:
+            callbacks = self.topics.get(topic, ())
+            if callback not in callbacks:
+                return False
+            callbacks = tuple(cb for cb in callbacks if cb != callback)
+            if callbacks:
+                self.topics[topic] = callbacks
+                return False
+            del self.topics[topic]
+            return True
+
+    def _schedule(self, topic: str) -> Future:
+        future = Future()
+        self._sync_queue.put((topic, future))
+        return future
+
+    def _sync_loop(self):
+        while True:
+            topic, future = self._sync_queue.get()
+            if topic is None:
+                return
+            try:
+                self._sync(topic)
+                future.set_result(None)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _sync(self, topic: str):
+        """Lleva la suscripción de pybit al estado que piden los callbacks registrados."""
+        with self._topics_lock:
+            if topic in self._unsubscribing:
+                return  # al confirmarse la baja se vuelve a sincronizar
+            wanted = bool(self.topics.get(topic))
+            interval, symbol = self._topic_args[topic]
+        req_id = self._req_id(topic)
+        if wanted and req_id is None:
+            self.kline_stream(interval=interval, symbol=symbol, callback=self._dispatch)
+        elif not wanted and req_id is not None:
+            # Mismo req_id que el alta, como hace pybit: su confirmación borra la suscripción y el callback
+            message = json.loads(self.subscriptions[req_id])
+            message["op"] = "unsubscribe"
+            with self._topics_lock:
+                self._unsubscribing.add(topic)
+            try:
+                self.ws.send(json.dumps(message))
+            except Exception:
+                # Sin conexión no llega confirmación: olvidar el topic para que no se resuscriba al reconectar
+                with self._topics_lock:
+                    self._unsubscribing.discard(topic)
+                self.subscriptions.pop(req_id, None)
+                self.callback_directory.pop(topic, None)
+
+    def _req_id(self, topic: str) -> Optional[str]:
+        # Coincidencia exacta en args: 'kline.1.BTCUSDT' no debe casar con otro símbolo con ese prefijo
+        for req_id, sub in list(self.subscriptions.items()):
+            if topic in json.loads(sub)["args"]:
+                return req_id
+        return None
+
+    def _process_unsubscription_message(self, message):
+        sub = self.subscriptions.get(message.get("req_id"))
+        super()._process_unsubscription_message(message)
+        if sub is None:
+            return
+        topic = json.loads(sub)["args"][0]
+        with self._topics_lock:
+            self._unsubscribing.discard(topic)
+        # Si la baja falló la suscripción sigue viva y no se reintenta; si no, un
+        # streamer pudo pedir el topic mientras tanto. Corre en el hilo lector: solo se encola.
+        if message.get("success") is True:
+            self._schedule(topic)
+
+    def exit(self):
+        self._sync_queue.put((None, None))
+        super().exit()
+
+    def _on_open(self):
+        super()._on_open()
+        for listener in list(self.listeners):
+            listener.on_open(self)
+
+    def _on_close(self):
+        super()._on_close()
+        for listener in list(self.listeners):
+            listener.on_close(self, None, None)
+
+    def _on_error(self, error):
+        for listener in list(self.listeners):
+            listener.on_error(self, error)
+        super()._on_error(error)
+
+# Una conexión WS por (testnet, channel_type); cada símbolo es solo una suscripción más
+_SHARED_WS: Dict[tuple, _SharedWebSocket] = {}
+_SHARED_WS_LOCK = threading.Lock()
+
+def _acquire_ws(streamer, testnet: bool, channel_type: str) -> _SharedWebSocket:
+    with _SHARED_WS_LOCK:
+        ws = _SHARED_WS.get((testnet, channel_type))
+        if ws is None:
+            ws = _SharedWebSocket(
+                testnet=testnet,
+                channel_type=channel_type,
+                ping_interval=20,
+                ping_timeout=10,
+                restart_on_error=True,
+            )
+            _SHARED_WS[(testnet, channel_type)] = ws
+        ws.listeners.append(streamer)
+        return ws
+
+def _release_ws(streamer, ws: _SharedWebSocket):
+    """Quita el streamer; la conexión se cierra cuando ya no la usa nadie."""
+    with _SHARED_WS_LOCK:
+        if streamer in ws.listeners:
+            ws.listeners.remove(streamer)
+        if ws.listeners:
+            return
+        for key, shared in list(_SHARED_WS.items()):
+            if shared is ws:
+                del _SHARED_WS[key]
+    ws.exit()
+
 class MarketDataStreamer:
     def __init__(self, client: BybitClient, symbol: str, category: str):
         self.logger = setup_logger(self.__class__.__name__)
         self.client = client
         self.symbol = symbol
         self.category = category
-        self._last_price: Optional[float] = None
+        # (último precio, instante monotónico): una sola asignación, los lectores nunca ven mezclas
+        self._last: Tuple[Optional[float], float] = (None, 0.0)
         self._stop = threading.Event()
-        self._thread: Optional[threading.Thread] = None
+        self._poll_thread: Optional[threading.Thread] = None
         self._ws: Optional[WebSocket] = None
-        self._debug_messages = 0
-        self._last_tick_ts: float = 0.0
-        self._watchdog_thread: Optional[threading.Thread] = None
+        self._log_error = self.logger.error
+        self._update_price = getattr(client, "update_price", None) or (lambda category, symbol, price: None)
+        self._on_kline: Optional[Callable[[Kline], None]] = None
 
         # Banderas de estado para la conexión
         self._is_websocket_connected: bool = False
@@ -54,21 +282,28 @@ class MarketDataStreamer:
     def on_open(self, ws):
         self.logger.info("Conexión WebSocket abierta.")
         self._is_websocket_connected = True
-        self.subscribe(ws)
 
     def on_close(self, ws, close_status_code, close_msg):
         if self._is_websocket_connected:
-            self.logger.warning(f"Conexión WebSocket cerrada. Código: {close_status_code}, Mensaje: {close_msg}")
+            self.logger.warning("Conexión WebSocket cerrada. Código: %s, Mensaje: %s", close_status_code, close_msg)
             self._is_websocket_connected = False
+            self._fallback_to_rest()
 
     def on_error(self, ws, error):
         if "Connection is already closed" in str(error):
             return
         if self._is_websocket_connected:
-            self.logger.error(f"Error en WebSocket: {error}")
+            self.logger.error("Error en WebSocket: %s", error)
             self._is_websocket_connected = False
+            self._fallback_to_rest()
+
+    def _fallback_to_rest(self):
+        """El ping/pong del WS detectó la caída: cubrir con REST hasta que pybit reconecte."""
+        if not self._stop.is_set():
+            self._start_rest_polling(self._on_kline)
 
-    def start(self, on_kline: Optional[Callable[[Dict], None]] = None):
+    def start(self, on_kline: Optional[Callable[[Kline], None]] = None):
+        self._on_kline = on_kline
         if getattr(self.client, "is_demo", False):
             self.logger.info("Demo mode: using REST polling for klines.")
             self._start_rest_polling(on_kline)
@@ -76,89 +311,65 @@ class MarketDataStreamer:
         
         try:
             self.logger.info("Attempting WebSocket subscription for real-time klines (1-minute)...")
-            self._ws = WebSocket(
-                testnet=getattr(self.client, "is_testnet", True),
-                channel_type="spot",
-                ping_interval=30,
-                ping_timeout=10,
-                restart_on_error=True,
-                on_open=self.on_open,
-                on_close=self.on_close,
-                on_error=self.on_error
-            )
+            self._ws = _acquire_ws(self, getattr(self.client, "is_testnet", True), _WS_CHANNEL)
+            if self._ws.is_connected():
+                self._is_websocket_connected = True
             
-            def cb(msg):
-                try:
-                    global _is_ws_down
-                    if _is_ws_down:
-                        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-                        print(f"{timestamp} | INFO | MarketDataStreamer | CONEXIÓN WEBSOCKET RECUPERADA. Operación normal restaurada.")
-                        _is_ws_down = False
-
-                    if self._debug_messages < 5:
-                        self.logger.info(f"WS kline message: {msg}")
-                        self._debug_messages += 1
-                    
-                    data = msg.get("data")
-                    if isinstance(data, list) and data:
-                        kline_data = data[0]
-                        # Solo procesar velas confirmadas
-                        if kline_data.get('confirm', False):
-                            kline = {
-                                'timestamp': int(kline_data['start']),
-                                'open': float(kline_data['open']),
-                                'high': float(kline_data['high']),
-                                'low': float(kline_data['low']),
-                                'close': float(kline_data['close']),
-                                'volume': float(kline_data['volume']),
-                            }
-                            self._last_price = kline['close']
-                            self._last_tick_ts = time.time()
-                            if on_kline:
-                                on_kline(kline)
-                                
-                except Exception as e:
-                    self.logger.error(f"Error parsing WS kline message: {e}")
-
-            self._ws.kline_stream(interval=1, symbol=self.symbol, callback=cb)
+            self._ws.add_kline(1, self.symbol, self._on_ws_kline)
             self.logger.info("WebSocket kline stream started.")
-            
-            if self._watchdog_thread is None or not self._watchdog_thread.is_alive():
-                self._watchdog_thread = threading.Thread(target=self._watchdog_loop, args=(on_kline,), daemon=True)
-                self._watchdog_thread.start()
-                
+
         except Exception as e:
-            self.logger.warning(f"WebSocket failed ({e}); falling back to REST polling for klines.")
+            self.logger.warning("WebSocket failed (%s); falling back to REST polling for klines.", e)
             self._start_rest_polling(on_kline)
 
-    def _start_rest_polling(self, on_kline: Optional[Callable[[Dict], None]]):
-        if self._thread and self._thread.is_alive():
+    def _on_ws_kline(self, msg):
+        """Callback del kline_stream; on_kline se toma de self._on_kline (fijado en start)."""
+        if self._stop.is_set():
             return
-        self._thread = threading.Thread(target=self._poll_loop, args=(on_kline,), daemon=True)
-        self._thread.start()
+        try:
+            if _ws_down_event.is_set():
+                timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+                print(f"{timestamp} | INFO | MarketDataStreamer | CONEXIÓN WEBSOCKET RECUPERADA. Operación normal restaurada.")
+                _ws_down_event.clear()
+
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("WS kline message: %s", msg)
 
-    def _watchdog_loop(self, on_kline: Optional[Callable[[Dict], None]]):
-        stale_secs = 70.0 # 1 minuto + 10s de margen
-        while not self._stop.is_set():
+            # Bybit siempre envía 'data' como lista: EAFP en vez de comprobar el tipo en cada mensaje
             try:
-                time.sleep(10)
-                if self._ws and (time.time() - self._last_tick_ts) > stale_secs and self._last_tick_ts > 0:
-                    self.logger.warning("WS kline stream sin actividad. Cambiando a REST Polling.")
-                    try:
-                        self._ws.exit()
-                    except Exception:
-                        pass
-                    self._ws = None
-                    self._start_rest_polling(on_kline)
-                    break
-            except Exception as e:
-                self.logger.error(f"Watchdog error: {e}")
-                time.sleep(5)
+                kline_data = msg["data"][0]
+            except (KeyError, IndexError, TypeError):
+                return
+            # Cada actualización (confirmada o no) trae el precio actual: se lo damos al cliente
+            # para que get_ticker no tenga que ir a la API
+            self._update_price(_WS_CHANNEL, self.symbol, kline_data['close'])
+
+            # Solo procesar velas confirmadas
+            if kline_data.get('confirm', False):
+                kline = _kline_from_ws(kline_data)
+                self._last = (kline.close, _monotonic())
+                on_kline = self._on_kline
+                if on_kline:
+                    on_kline(kline)
+
+        except Exception as e:
+            self._log_error("Error parsing WS kline message: %s", e)
+
+    def _start_rest_polling(self, on_kline: Optional[Callable[[Kline], None]]):
+        if self._poll_thread and self._poll_thread.is_alive():
+            return
+        # Un hilo daemon por streamer: el bucle vive toda la caída y no debe bloquear la salida
+        self._poll_thread = threading.Thread(
+            target=self._poll_loop, args=(on_kline,), name=f"mdstream-{self.symbol}", daemon=True
+        )
+        self._poll_thread.start()
 
-    def _poll_loop(self, on_kline: Optional[Callable[[Dict], None]]):
+    def _poll_loop(self, on_kline: Optional[Callable[[Kline], None]]):
         self.logger.info("Iniciando REST polling loop para klines...")
         last_kline_ts = 0
-        while not self._stop.is_set():
+        # Si el WS vuelve (on_open), el polling de respaldo termina solo
+        while not self._stop.is_set() and not self._is_websocket_connected:
+            retry = False
             try:
                 klines = self.client.get_klines(symbol=self.symbol, category=self.category, interval=1, limit=2)
                 if klines and klines['list']:
@@ -166,38 +377,42 @@ class MarketDataStreamer:
                         self.logger.info("Conexión de respaldo (REST Polling) recuperada.")
                         self._is_polling_down = False
 
-                    latest_kline_raw = klines['list'][0]
-                    kline_ts = int(latest_kline_raw[0])
-                    
+                    # list[0] es la vela en curso; list[1] la última cerrada (como 'confirm' en el WS)
+                    rows = klines['list']
+                    closed_raw = rows[1] if len(rows) > 1 else rows[0]
+                    kline_ts = int(closed_raw[0])
+
                     if kline_ts > last_kline_ts:
                         last_kline_ts = kline_ts
-                        kline = {
-                            'timestamp': kline_ts,
-                            'open': float(latest_kline_raw[1]),
-                            'high': float(latest_kline_raw[2]),
-                            'low': float(latest_kline_raw[3]),
-                            'close': float(latest_kline_raw[4]),
-                            'volume': float(latest_kline_raw[5]),
-                        }
-                        self._last_price = kline['close']
-                        self._last_tick_ts = time.time()
+                        kline = _kline_from_rest(closed_raw)
+                        self._last = (kline.close, _monotonic())
                         if on_kline:
                             on_kline(kline)
+                    else:
+                        retry = True  # Bybit aún no cerró la vela: reintentar en breve
             except Exception as e:
                 if not self._is_polling_down:
-                    self.logger.error(f"Se perdió la conexión de respaldo (REST Polling): {e}")
+                    self.logger.error("Se perdió la conexión de respaldo (REST Polling): %s", e)
                     self._is_polling_down = True
-            
-            time.sleep(30)
+
+            if retry:
+                wait = _POLL_RETRY_SECS + random.uniform(0.0, 1.0)
+            else:
+                # Una sola consulta por vela: dormir hasta poco después del cierre del minuto
+                wait = 60.0 - (time.time() % 60.0) + _POLL_CLOSE_DELAY_SECS
+            if self._stop.wait(wait):
+                return
 
     def stop(self):
         self._stop.set()
         if self._ws:
             try:
-                self._ws.exit()
+                self._ws.remove_kline(1, self.symbol, self._on_ws_kline)
+            except Exception:
+                pass
+            try:
+                _release_ws(self, self._ws)
             except Exception:
                 pass
-        if self._thread:
-            self._thread.join(timeout=1)
-        if self._watchdog_thread:
-            self._watchdog_thread.join(timeout=1)
+        if self._poll_thread:
+            self._poll_thread.join(timeout=1)
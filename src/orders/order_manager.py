@@ -1,25 +1,128 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from decimal import Decimal, ROUND_CEILING, ROUND_FLOOR
 from typing import Optional, Dict, Any, List
 from src.logger import setup_logger
-from src.exchange.bybit_client import BybitClient
-import math
+from src.exchange.bybit_client import BybitClient, _step_decimals
+import threading
 import time
 
+# Los montos en USDT (quote) se envían con 4 decimales
+_USDT_FMT = ".4f"
+
+# Esperas entre consultas de ejecuciones tras enviar una orden (total ~1.2 s)
+_FILL_POLL_DELAYS = (0.025, 0.05, 0.1, 0.2, 0.4, 0.4)
+
+# Los filtros parseados del símbolo se reutilizan durante este tiempo en el camino de órdenes
+_META_TTL = 60.0
+
+
+@dataclass(slots=True, frozen=True)
+class SymbolMeta:
+    """Filtros del símbolo ya convertidos a números, listos para normalizar cantidades."""
+    min_qty: float = 0.0
+    qty_step: float = 0.0
+    qty_step_dec: Optional[Decimal] = None  # paso exacto para cuantizar sin error de coma flotante
+    precision: int = 6  # decimales de la cantidad base
+    qty_fmt: str = ".6f"  # especificación de formato precalculada para 'precision'
+    price_tick: float = 0.0
+    min_notional: float = 0.0
+    fetched_at: float = 0.0
+
+
+def _quantize(value: float, step: Optional[Decimal], rounding) -> float:
+    """Redondea 'value' a un múltiplo exacto de 'step' (ROUND_CEILING/ROUND_FLOOR) en una sola pasada."""
+    if step is None or value <= 0:
+        return value
+    return float((Decimal(repr(value)) / step).to_integral_value(rounding=rounding) * step)
+
+
+def _qceil(value: float, meta: SymbolMeta) -> float:
+    """Cantidad base redondeada hacia arriba al paso y nunca por debajo de la cantidad mínima."""
+    return max(_quantize(value, meta.qty_step_dec, ROUND_CEILING), meta.min_qty)
+
+
+def _qfloor(value: float, meta: SymbolMeta) -> float:
+    """Cantidad base redondeada hacia abajo al paso (ventas: nunca más de lo que se tiene)."""
+    return _quantize(value, meta.qty_step_dec, ROUND_FLOOR)
+
 
 class OrderManager:
+    __slots__ = ("logger", "client", "symbol", "category", "base_coin", "_meta", "_place_market", "_last_executions", "_warm",
+                 "_meta_lock", "_prefetch_pool", "_pool_lock")
+
     def __init__(self, client: BybitClient, symbol: str, category: str = "spot"):
         self.logger = setup_logger(self.__class__.__name__)
         self.client = client
         self.symbol = symbol
         self.category = category
+        # Moneda base del par (BTCUSDT -> BTC), calculada una sola vez
+        self.base_coin = symbol[:-4] if symbol.endswith("USDT") else symbol.replace("USDT", "")
+        self._meta: Optional[SymbolMeta] = None
+        # Una sola consulta de filtros en vuelo: el resto de hilos espera y reutiliza su resultado
+        self._meta_lock = threading.Lock()
+        # Hilo para pedir ticker y filtros en paralelo antes de una compra; se crea al primer uso (ver close)
+        self._prefetch_pool: Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+        # Símbolo, categoría y tipo no cambian: se fijan una vez y cada orden solo pasa lado/cantidad
+        self._place_market = partial(client.place_order, symbol=symbol, category=category, order_type="Market")
+        self._last_executions = (None, [])  # (orderId, ejecuciones) de la última orden confirmada
+
+        # Precarga de filtros y precio en segundo plano para que la primera orden no espere a la API
+        self._warm = threading.Event()
+        threading.Thread(target=self._prewarm, name="om-prewarm", daemon=True).start()
+
+    def _prewarm(self):
+        try:
+            self._symbol_meta()
+            self._current_price()
+        except Exception as e:
+            self.logger.warning("No se pudo precargar la información de %s: %s", self.symbol, e)
+        finally:
+            self._warm.set()
+
+    def wait_warm(self, timeout: float = 2.0) -> bool:
+        """Espera (como mucho 'timeout' s) a que termine la precarga. Devuelve True si terminó."""
+        return self._warm.wait(timeout)
+
+    def _symbol_meta(self) -> SymbolMeta:
+        """Filtros del símbolo parseados una vez por TTL; los fallos no se cachean."""
+        if self._meta_is_fresh():
+            return self._meta
+        with self._meta_lock:
+            if self._meta_is_fresh():
+                return self._meta
+            return self._fetch_symbol_meta()
+
+    def _fetch_symbol_meta(self) -> SymbolMeta:
+        now = time.monotonic()
 
-    def get_min_order_value(self) -> float:
-        """Devuelve el valor mínimo de la orden (minNotional) para el símbolo actual."""
         try:
-            min_val = self.client.get_min_order_value(self.symbol, self.category)
-            return float(min_val) if min_val is not None else 0.0
+            filters = self.client.get_symbol_filters(self.symbol, category=self.category) or {}
         except Exception as e:
-            self.logger.error(f"No se pudo obtener el valor mínimo de la orden: {e}")
-            return 0.0
+            self.logger.error("No se pudieron obtener los filtros de %s: %s", self.symbol, e)
+            filters = {}
+
+        qty_step = float(filters.get("qty_step") or 0)
+        precision = _step_decimals(qty_step) if qty_step > 0 else 6
+        meta = SymbolMeta(
+            min_qty=float(filters.get("min_qty") or 0),
+            qty_step=qty_step,
+            qty_step_dec=Decimal(repr(qty_step)) if qty_step > 0 else None,
+            precision=precision,
+            qty_fmt=f".{precision}f",
+            price_tick=float(filters.get("price_tick") or 0),
+            min_notional=float(filters.get("min_notional") or 0),
+            fetched_at=now,
+        )
+        if filters:
+            self._meta = meta
+        return meta
+
+    def get_min_order_value(self) -> float:
+        """Devuelve el valor mínimo de la orden (minNotional) para el símbolo actual."""
+        return self._symbol_meta().min_notional
 
     def get_balance(self, coin: str) -> float:
         """Devuelve el balance disponible para una moneda específica."""
@@ -27,14 +130,52 @@ class OrderManager:
             balances = self.client.get_wallet_balance(coins=[coin])
             return balances.get(coin, 0.0)
         except Exception as e:
-            self.logger.error(f"No se pudo obtener el balance para {coin}: {e}")
+            self.logger.error("No se pudo obtener el balance para %s: %s", coin, e)
             return 0.0
 
-    def market_buy(self, qty: str, order_link_id: Optional[str] = None) -> Dict[str, Any]:
+    def _current_price(self, price_hint: Optional[float] = None) -> float:
+        """Precio para convertir/normalizar: el que ya trae la estrategia o, si no, el ticker (cacheado en el cliente)."""
+        if price_hint and price_hint > 0:
+            return float(price_hint)
+        try:
+            ticker = self.client.get_ticker(symbol=self.symbol, category=self.category)
+            return float(ticker.get("lastPrice") or ticker.get("lp") or ticker.get("price"))
+        except Exception:
+            return 0.0
+
+    def _prefetch_symbol_state(self, price_hint: Optional[float] = None):
+        """Devuelve (precio, SymbolMeta); si hay que ir a la API, ticker y filtros se piden a la vez."""
+        if (price_hint and price_hint > 0) or self._meta_is_fresh():
+            return self._current_price(price_hint), self._symbol_meta()
+        price_future = self._prefetch_executor().submit(self._current_price, price_hint)
+        meta = self._symbol_meta()
+        return price_future.result(), meta
+
+    def _prefetch_executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._prefetch_pool is None:
+                self._prefetch_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="om-prefetch")
+            return self._prefetch_pool
+
+    def close(self):
+        """Detiene el hilo de prefetch: las tareas pendientes se cancelan y la que esté en curso termina sola."""
+        with self._pool_lock:
+            pool, self._prefetch_pool = self._prefetch_pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _meta_is_fresh(self) -> bool:
+        # Los rechazos por filtros los gestiona el cliente (invalidate_filters): si descartó
+        # los filtros del símbolo, el SymbolMeta derivado de ellos tampoco vale
+        meta = self._meta
+        return (meta is not None and time.monotonic() - meta.fetched_at < _META_TTL
+                and self.client.filters_cached(self.symbol, self.category))
+
+    def market_buy(self, qty: str, order_link_id: Optional[str] = None, price_hint: Optional[float] = None) -> Dict[str, Any]:
         """
         Recibe cantidad en BASE asset (BTC).
         Como Bybit V5 Spot Market Buy requiere 'qty' en Quote (USDT),
-        convertimos BTC -> USDT usando el precio actual.
+        convertimos BTC -> USDT usando el precio actual (o price_hint si se indica).
         """
         # Parsear cantidad solicitada
         try:
@@ -42,79 +183,54 @@ class OrderManager:
         except Exception:
             qty_base = 0.0
 
-        # Precio actual
-        try:
-            ticker = self.client.get_ticker(symbol=self.symbol, category=self.category)
-            price = float(ticker.get("lastPrice") or ticker.get("lp") or ticker.get("price"))
-        except Exception:
-            price = 0.0
+        # Precio actual y filtros del símbolo, pedidos en paralelo si no están cacheados
+        price, meta = self._prefetch_symbol_state(price_hint)
 
         if price <= 0:
             self.logger.error("No se pudo obtener precio para convertir Market Buy Base -> Quote.")
             return {}
 
-        # Filtros y mínimos del símbolo (para normalizar la cantidad base antes de convertir)
-        filters = self.client.get_symbol_filters(self.symbol, category=self.category)
-        
-        try:
-            min_qty = filters.get("min_qty", 0.0) if isinstance(filters, dict) else 0.0
-        except Exception:
-            min_qty = 0.0
-        try:
-            qty_step = filters.get("qty_step", 0.0) if isinstance(filters, dict) else 0.0
-        except Exception:
-            qty_step = 0.0
-
-        # Redondeo hacia ARRIBA al paso
-        if qty_step > 0 and qty_base > 0:
-            qty_base = math.ceil(qty_base / qty_step) * qty_step
-
-        # Asegurar mínimo de cantidad
-        if qty_base < min_qty:
-            qty_base = min_qty
+        # Redondeo hacia ARRIBA al paso, respetando la cantidad mínima
+        qty_base = _qceil(qty_base, meta)
 
         # Convertir a USDT
         usdt_amount = qty_base * price
         
-        self.logger.info(f"Market Buy Base: {qty_base} {self.symbol} => {usdt_amount:.4f} USDT")
-        
-        return self.market_buy_usdt(usdt_amount, order_link_id)
+        self.logger.info("Market Buy Base: %s %s => %.4f USDT", qty_base, self.symbol, usdt_amount)
+
+        # El mínimo nocional ya está en 'meta': se envía directamente, sin pasar por market_buy_usdt
+        if usdt_amount < meta.min_notional:
+            self.logger.error("El monto de la orden %s USDT es menor que el mínimo requerido de %s USDT.", usdt_amount, meta.min_notional)
+            return {"retCode": 10001, "retMsg": "Order amount is below the minimum required.", "result": {}}
+
+        return self._submit_market_buy_usdt(usdt_amount, order_link_id)
 
     def market_buy_usdt(self, usdt_amount: float, order_link_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Realiza compra Market enviando la cantidad en USDT (Quote Coin).
         En Bybit V5 Spot, Market Buy usa 'qty' como monto en Quote Coin.
         """
-        try:
-            # 1. Validar mínimos (MinNotional)
-            try:
-                min_notional = self.client.get_min_order_value(self.symbol, category=self.category)
-            except Exception:
-                min_notional = 1.0 # Default fallback
-            
-            if min_notional is None:
-                 min_notional = 1.0
+        # 1. Validar mínimos (MinNotional)
+        min_notional = self._symbol_meta().min_notional
 
-            if usdt_amount < min_notional:
-                # Ya no se ajusta automáticamente. La estrategia es responsable de validar.
-                # Devolver un error claro si se intenta una orden por debajo del mínimo.
-                self.logger.error(f"El monto de la orden {usdt_amount} USDT es menor que el mínimo requerido de {min_notional} USDT.")
-                return {"retCode": 10001, "retMsg": "Order amount is below the minimum required.", "result": {}}
+        if usdt_amount < min_notional:
+            # Ya no se ajusta automáticamente. La estrategia es responsable de validar.
+            # Devolver un error claro si se intenta una orden por debajo del mínimo.
+            self.logger.error("El monto de la orden %s USDT es menor que el mínimo requerido de %s USDT.", usdt_amount, min_notional)
+            return {"retCode": 10001, "retMsg": "Order amount is below the minimum required.", "result": {}}
 
+        return self._submit_market_buy_usdt(usdt_amount, order_link_id)
+
+    def _submit_market_buy_usdt(self, usdt_amount: float, order_link_id: Optional[str] = None) -> Dict[str, Any]:
+        """Envía la compra Market en USDT (ya validada) y espera a que aparezcan sus ejecuciones."""
+        try:
             # Formatear a 4 decimales para USDT
-            qty_str = f"{usdt_amount:.4f}"
+            qty_str = format(usdt_amount, _USDT_FMT)
 
-            self.logger.info(f"Enviando Market Buy: {qty_str} USDT (Quote Amt)")
+            self.logger.info("Enviando Market Buy: %s USDT (Quote Amt)", qty_str)
 
             # --- INICIO: Lógica de reintentos ---
-            order_response = self.client.place_order(
-                symbol=self.symbol,
-                side="Buy",
-                order_type="Market",
-                qty=qty_str,
-                category=self.category,
-                order_link_id=order_link_id,
-            )
+            order_response = self._place_market(side="Buy", qty=qty_str, order_link_id=order_link_id)
 
             # Si la orden fue rechazada de inmediato, no hay nada que reintentar.
             if not order_response or order_response.get("retCode", 0) != 0:
@@ -126,23 +242,14 @@ class OrderManager:
                 return order_response
 
             # Reintentar obtener los detalles de la ejecución
-            max_retries = 5
-            retry_delay_ms = 200
-            for i in range(max_retries):
-                time.sleep(retry_delay_ms / 1000)
-                try:
-                    executions = self.client.get_executions(symbol=self.symbol, category=self.category, orderId=order_id)
-                    if isinstance(executions, dict) and executions.get("result", {}).get("list"):
-                        # ¡Éxito! Se encontraron las ejecuciones. Devolvemos la respuesta original de la orden.
-                        self.logger.info(f"Ejecuciones encontradas para OrderID {order_id} en el intento {i+1}.")
-                        return order_response
-                except Exception as e:
-                    self.logger.error(f"Error al obtener ejecuciones en el intento {i+1}: {e}")
-                
-                self.logger.warning(f"No se encontraron ejecuciones para OrderID {order_id} en el intento {i+1}/{max_retries}. Reintentando...")
+            max_retries = len(_FILL_POLL_DELAYS)
+            if self._poll_executions(order_id):
+                # ¡Éxito! Se encontraron las ejecuciones. Devolvemos la respuesta original de la orden.
+                self.logger.info("Ejecuciones encontradas para OrderID %s.", order_id)
+                return order_response
 
             # Si después de todos los reintentos no hay ejecuciones, se considera un fallo.
-            self.logger.error(f"Fallo definitivo: No se encontraron ejecuciones para OrderID {order_id} después de {max_retries} reintentos.")
+            self.logger.error("Fallo definitivo: No se encontraron ejecuciones para OrderID %s después de %d reintentos.", order_id, max_retries)
             # Devolvemos una respuesta de error consistente con la API de Bybit
             return {
                 "retCode": 17014, # Código de error inventado para "Execution not found"
@@ -152,9 +259,56 @@ class OrderManager:
             # --- FIN: Lógica de reintentos ---
             
         except Exception as e:
-            self.logger.error(f"Error en market_buy_usdt: {e}")
+            self.logger.error("Error en market_buy_usdt: %s", e)
             return {}
 
+    def market_buy_batch(self, usdt_amounts: List[float]) -> Dict[str, Any]:
+        """
+        Varias compras Market en USDT en una sola petición (create-batch).
+        Los montos por debajo del mínimo nocional se descartan con un aviso.
+        """
+        min_notional = self._symbol_meta().min_notional
+        orders = []
+        for amount in usdt_amounts:
+            if amount < min_notional:
+                self.logger.warning("Monto %s USDT omitido del lote: menor que el mínimo de %s USDT.", amount, min_notional)
+                continue
+            orders.append({
+                "symbol": self.symbol,
+                "side": "Buy",
+                "orderType": "Market",
+                "qty": format(amount, _USDT_FMT),
+            })
+
+        if not orders:
+            return {"retCode": 10001, "retMsg": "No order in the batch reaches the minimum amount.", "result": {}}
+
+        self.logger.info("Enviando lote de %d Market Buy en USDT", len(orders))
+        return self.client.place_orders_batch(self.category, orders)
+
+    def _poll_executions(self, order_id: str) -> List[Dict[str, Any]]:
+        """
+        Consulta las ejecuciones de la orden con espera creciente (25 ms ... 400 ms) hasta que aparezcan.
+        Devuelve la lista (vacía si no llegaron) y la recuerda para last_fill.
+        """
+        for i, delay in enumerate(_FILL_POLL_DELAYS, 1):
+            time.sleep(delay)
+            try:
+                # Pasar 'orderId' (camelCase) coincidiendo con la definición en BybitClient
+                executions = self.client.get_executions(symbol=self.symbol, category=self.category, orderId=order_id)
+            except Exception as e:
+                self.logger.error("Error al obtener ejecuciones en el intento %d: %s", i, e)
+                continue
+
+            if isinstance(executions, dict):
+                exec_list = (executions.get("result") or {}).get("list") or executions.get("list") or []
+            else:
+                exec_list = []
+            if exec_list:
+                self._last_executions = (order_id, exec_list)
+                return exec_list
+        return []
+
     def last_fill(self, order_response: Dict[str, Any]) -> Dict[str, Any]:
         """
         Recupera la información de ejecución (fill) de una orden recién enviada.
@@ -172,99 +326,51 @@ class OrderManager:
                 order_id = order_response.get("orderId")
             
             if not order_id:
-                # self.logger.warning(f"No se encontró orderId en la respuesta: {order_response}")
+                # self.logger.warning("No se encontró orderId en la respuesta: %s", order_response)
                 return {}
 
-            # 2. Consultar ejecuciones (fills)
-            # Pequeño delay para dar tiempo al matching engine
-            time.sleep(0.5)
-            
-            # Corregido: pasar 'orderId' (camelCase) coincidiendo con la definición en BybitClient
-            executions = self.client.get_executions(symbol=self.symbol, category=self.category, orderId=order_id)
-            
-            # executions structure: {'retCode': 0, 'result': {'list': [...], ...}}
-            # Ojo: si get_executions devuelve directo el dict result, ajustamos.
-            # En bybit_client.py: return self.session.get_executions(...)
-            # Pybit suele devolver estructura completa.
-            
-            if isinstance(executions, dict):
-                 exec_list = executions.get("result", {}).get("list", [])
-                 # Fallback si pybit devuelve directo el result (depende version)
-                 if not exec_list and "list" in executions:
-                     exec_list = executions["list"]
-            else:
-                 exec_list = []
-            
+            # 2. Consultar ejecuciones (fills): si market_buy_usdt ya las encontró se reutilizan,
+            # si no, sondeo con espera creciente en vez de un delay fijo
+            cached_id, exec_list = self._last_executions
+            if cached_id != order_id:
+                exec_list = self._poll_executions(order_id)
+
             if exec_list:
                 # Retornamos el primer fill (o el más reciente)
                 return exec_list[0]
             
-            self.logger.warning(f"No se encontraron ejecuciones para OrderID {order_id}")
+            self.logger.warning("No se encontraron ejecuciones para OrderID %s", order_id)
             return {}
             
         except Exception as e:
-            self.logger.error(f"Error en last_fill: {e}")
+            self.logger.error("Error en last_fill: %s", e)
             return {}
 
-    def _normalize_qty_base(self, qty_base: float, round_mode: str = "ceil"):
+    def _normalize_qty_base(self, qty_base: float, round_mode: str = "ceil", price_hint: Optional[float] = None):
         """
         Normaliza cantidad en moneda base respetando filtros del símbolo.
+        El precio solo hace falta para el ajuste por mínimo nocional (modo "ceil").
         """
-        # Precio actual
-        try:
-            ticker = self.client.get_ticker(symbol=self.symbol, category=self.category)
-            price = float(ticker.get("lastPrice") or ticker.get("lp") or ticker.get("price"))
-        except Exception:
-            price = None
+        price = None
+        if round_mode == "ceil":
+            price = self._current_price(price_hint) or None
 
-        # Filtros y mínimos del símbolo
-        filters = self.client.get_symbol_filters(self.symbol, category=self.category)
-        lot = filters.get("lotSizeFilter", {}) if isinstance(filters, dict) else {}
+        # Filtros y mínimos del símbolo (ya parseados y cacheados)
+        meta = self._symbol_meta()
+        min_qty, qty_step, precision, min_notional = meta.min_qty, meta.qty_step, meta.precision, meta.min_notional
 
-        try:
-            min_qty = float(lot.get("minOrderQty") or 0)
-        except Exception:
-            min_qty = 0.0
-        try:
-            qty_step = float(lot.get("qtyStep") or 0)
-        except Exception:
-            qty_step = 0.0
-        try:
-            precision = int(lot.get("basePrecision") or 6)
-        except Exception:
-            precision = 6
-
-        try:
-            min_notional = self.client.get_min_order_value(self.symbol, category=self.category)
-        except Exception:
-            min_notional = 0.0
-
-        # Redondeo al paso según modo
-        if qty_step > 0 and qty_base > 0:
-            if round_mode == "ceil":
-                qty_base = math.ceil(qty_base / qty_step) * qty_step
-            else:
-                qty_base = math.floor(qty_base / qty_step) * qty_step
-
-        # Asegurar mínimo de cantidad
-        if round_mode == "ceil" and qty_base < min_qty:
-            qty_base = min_qty
+        # Redondeo al paso según modo (en "ceil" también se asegura la cantidad mínima)
+        qty_base = _qceil(qty_base, meta) if round_mode == "ceil" else _qfloor(qty_base, meta)
 
         # Ajuste por mínimo nocional
         if round_mode == "ceil" and price and price > 0 and min_notional and min_notional > 0:
             notional = qty_base * price
             if notional < min_notional:
-                needed_base = min_notional / price
-                if qty_step > 0:
-                    qty_base = math.ceil(needed_base / qty_step) * qty_step
-                else:
-                    qty_base = needed_base
-                if qty_base < min_qty:
-                    qty_base = min_qty
+                qty_base = _qceil(min_notional / price, meta)
 
         return qty_base, price, min_notional, min_qty, qty_step, precision
 
-    def market_sell(self, qty: str, order_link_id: Optional[str] = None) -> Dict[str, Any]:
+    def market_sell(self, qty: str, order_link_id: Optional[str] = None, price_hint: Optional[float] = None) -> Dict[str, Any]:
         """
         Vende Market normalizando la cantidad base (BTC).
         En Bybit V5 Spot, Market Sell usa 'qty' como monto en Base Coin.
@@ -275,42 +381,11 @@ class OrderManager:
         except Exception:
             requested_qty = 0.0
 
-        # Balance disponible del activo base
-        base_coin = self.symbol.replace("USDT", "")
-        try:
-            balance = self.client.get_wallet_balance(coin=base_coin)
-            # Asumimos que get_wallet_balance devuelve float o dict.
-            # Ajustar según implementación real de BybitClient.get_wallet_balance
-            # Si devuelve dict completo, extraer 'free'.
-            if isinstance(balance, dict):
-                 # Depende de la estructura de respuesta. 
-                 # En bybit_client.py get_wallet_balance suele devolver dict de monedas.
-                 # Asumiremos que el cliente maneja la lógica o devolvemos un float si está simplificado.
-                 # Si no, intentamos extraer.
-                 avail = float(balance.get("transferBalance") or balance.get("walletBalance") or 0)
-                 # En Unified Trading Account: walletBalance.
-            else:
-                 avail = float(balance)
-        except Exception:
-            avail = 999999.0 # Fallback si falla balance check (riesgoso pero permite intentar)
-
         # Normalizar
-        qty_base, _, _, _, _, precision = self._normalize_qty_base(requested_qty, round_mode="floor")
-
-        # Verificar balance (opcional pero recomendado)
-        # if qty_base > avail:
-        #    qty_base = avail 
-        # (Comentado para no bloquear si el balance check falla)
+        qty_base, _, _, _, _, _ = self._normalize_qty_base(requested_qty, round_mode="floor", price_hint=price_hint)
 
-        qty_str = format(qty_base, f".{precision}f")
+        qty_str = format(qty_base, self._symbol_meta().qty_fmt)
         
-        self.logger.info(f"Market Sell Base: {qty_str}")
-
-        return self.client.place_order(
-            symbol=self.symbol,
-            side="Sell",
-            order_type="Market",
-            qty=qty_str,
-            category=self.category,
-            order_link_id=order_link_id,
-        )
+        self.logger.info("Market Sell Base: %s", qty_str)
+
+        return self._place_market(side="Sell", qty=qty_str, order_link_id=order_link_id)
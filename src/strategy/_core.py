@@ -0,0 +1,43 @@
+from src.strategy import _indicator_jit as ind
+
+
+class IndicatorCore:
+    """
+    Estado de indicadores por vela (EMA 9/21, RSI 14, ATR 14, ADX 14 y media de volumen 20)
+    que las estrategias componen. Cada push() es O(1) y tras él los valores quedan como atributos.
+    """
+    __slots__ = ("_state", "_vol_ring", "_vol_idx", "last_ts",
+                 "ema9", "ema21", "adx", "rsi", "atr", "volume", "vol_sma")
+    # Velas necesarias para que todos los valores coincidan con pandas_ta (antes serían NaN)
+    WARMUP_BARS = ind.WARMUP_BARS
+
+    def __init__(self):
+        self._state = ind.new_state()
+        self._vol_ring = ind.new_vol_ring()
+        self._vol_idx = 0
+        self.last_ts = 0  # timestamp de la última vela incorporada
+        self.ema9 = self.ema21 = self.adx = self.rsi = self.atr = 0.0
+        self.volume = self.vol_sma = 0.0
+
+    @property
+    def bars(self) -> int:
+        """Velas incorporadas hasta ahora."""
+        return int(self._state[ind.BARS])
+
+    def push(self, kline) -> bool:
+        """
+        Incorpora una vela (timestamp, open, high, low, close, volume).
+        Devuelve False si es repetida o atrasada (p.ej. al pasar de WS a REST): ya está en el estado.
+        """
+        ts, o, h, l, c, v = kline
+        if ts <= self.last_ts:
+            return False
+        self.last_ts = ts
+
+        state = ind.update(self._state, o, h, l, c, v, self._vol_ring, self._vol_idx)
+        self._vol_idx = (self._vol_idx + 1) % ind.VOL_WINDOW
+
+        self.ema9, self.ema21 = state[ind.EMA9], state[ind.EMA21]
+        self.adx, self.rsi, self.atr = state[ind.ADX], state[ind.RSI], state[ind.ATR]
+        self.volume, self.vol_sma = v, state[ind.VOL_SUM] / ind.VOL_WINDOW
+        return True
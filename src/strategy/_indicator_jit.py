@@ -0,0 +1,98 @@
+import numpy as np
+from src.strategy._njit import njit
+
+# Posiciones del vector de estado (float64) que mantiene update() entre velas
+EMA9, EMA21, AVG_GAIN, AVG_LOSS, ATR, PLUS_DM, MINUS_DM, ADX, RSI, \
+    PREV_HIGH, PREV_LOW, PREV_CLOSE, BARS, VOL_SUM = range(14)
+STATE_SIZE = 14
+VOL_WINDOW = 20
+# Velas hasta que todos los valores existen en pandas_ta: ADX suaviza DX desde la vela 15
+# (±DM con 14 muestras) y necesita otras 14 (min_periods)
+WARMUP_BARS = 28
+
+# Factores de suavizado precalculados: EMA k = 2/(n+1) y Wilder 1/n
+K9 = 2.0 / 10.0
+K21 = 2.0 / 22.0
+W14 = 1.0 / 14.0
+B14 = 1.0 - W14
+
+# Firmas explícitas: numba compila al importar el módulo y no en la primera vela.
+# fastmath permite contraer prev + k * (value - prev) en una sola FMA (los datos nunca son NaN/inf).
+_EMA_SIG = "float64(float64, float64, float64, float64, float64)"
+_WILDER_SIG = "float64(float64, float64, float64)"
+_UPDATE_SIG = "float64[:](float64[:], float64, float64, float64, float64, float64, float64[:], int64)"
+
+
+def new_state():
+    return np.zeros(STATE_SIZE, dtype=np.float64)
+
+
+def new_vol_ring():
+    return np.zeros(VOL_WINDOW, dtype=np.float64)
+
+
+@njit(_EMA_SIG, cache=True, fastmath=True)
+def _ema(prev, value, k, period, n):
+    # Durante las primeras `period` velas la semilla es la media simple acumulada, como en pandas_ta
+    if n <= period:
+        return prev + (value - prev) / n
+    return prev + k * (value - prev)
+
+
+@njit(_WILDER_SIG, cache=True, fastmath=True)
+def _wilder(prev, value, n):
+    # RMA de pandas_ta: ewm(alpha=1/14, adjust=True) con n muestras. La media ponderada
+    # sum(B14^i * x) / sum(B14^i) equivale a avanzar prev con peso W14 / (1 - B14^n)
+    return prev + (value - prev) * W14 / (1.0 - B14 ** n)
+
+
+@njit(_UPDATE_SIG, cache=True, fastmath=True)
+def update(state, o, h, l, c, v, vol_ring, vol_idx):
+    """
+    Incorpora una vela al estado de EMA 9/21, RSI 14, ATR 14, ADX 14 (Wilder) y suma de volumen 20.
+    Modifica 'state' y 'vol_ring' en sitio (el llamador avanza vol_idx) y devuelve 'state'.
+    """
+    n = state[BARS] + 1.0
+    state[BARS] = n
+
+    if n == 1.0:
+        state[EMA9] = c
+        state[EMA21] = c
+    else:
+        state[EMA9] = _ema(state[EMA9], c, K9, 9.0, n)
+        state[EMA21] = _ema(state[EMA21], c, K21, 21.0, n)
+
+        # RSI, ATR y ADX parten de diferencias con la vela anterior: su primera muestra es la vela 2
+        m = n - 1.0
+        prev_close = state[PREV_CLOSE]
+        change = c - prev_close
+        state[AVG_GAIN] = _wilder(state[AVG_GAIN], change if change > 0.0 else 0.0, m)
+        state[AVG_LOSS] = _wilder(state[AVG_LOSS], -change if change < 0.0 else 0.0, m)
+        avg_loss = state[AVG_LOSS]
+        state[RSI] = 100.0 - 100.0 / (1.0 + state[AVG_GAIN] / avg_loss) if avg_loss > 0.0 else 100.0
+
+        tr = max(h - l, abs(h - prev_close), abs(l - prev_close))
+        state[ATR] = _wilder(state[ATR], tr, m)
+
+        up = h - state[PREV_HIGH]
+        down = state[PREV_LOW] - l
+        state[PLUS_DM] = _wilder(state[PLUS_DM], up if up > down and up > 0.0 else 0.0, m)
+        state[MINUS_DM] = _wilder(state[MINUS_DM], down if down > up and down > 0.0 else 0.0, m)
+        # +DI y -DI comparten el divisor ATR: se cancela en DX
+        di_sum = state[PLUS_DM] + state[MINUS_DM]
+        dx = 100.0 * abs(state[PLUS_DM] - state[MINUS_DM]) / di_sum if di_sum > 0.0 else 0.0
+        if m >= 14.0:
+            # DX existe desde que ±DM tienen 14 muestras, como en pandas_ta (NaN antes)
+            state[ADX] = _wilder(state[ADX], dx, m - 13.0)
+
+    state[PREV_HIGH] = h
+    state[PREV_LOW] = l
+    state[PREV_CLOSE] = c
+
+    # Media de volumen: suma móvil sobre el anillo (entra la nueva, sale la más antigua)
+    state[VOL_SUM] += v - vol_ring[vol_idx]
+    vol_ring[vol_idx] = v
+    if vol_idx == VOL_WINDOW - 1:
+        # Una vez por vuelta se recalcula la suma exacta: el error de sumar y restar no se acumula
+        state[VOL_SUM] = vol_ring.sum()
+    return state
@@ -0,0 +1,9 @@
+# numba es opcional: sin él, los kernels decorados se ejecutan como Python normal
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Sustituto sin efecto de numba.njit; admite @njit y @njit(...)."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda fn: fn
@@ -1,10 +1,34 @@
+import logging
+import threading
 import time
-from typing import Optional, Dict
-import pandas as pd
-import pandas_ta as ta
+from typing import Optional
 from src.logger import setup_logger
+from src.strategy._core import IndicatorCore
+
+# Velas necesarias antes de operar con los indicadores (ver IndicatorCore)
+_WARMUP_BARS = IndicatorCore.WARMUP_BARS
+
+def _decision(mask: int):
+    """(comprar, motivo) para una combinación de condiciones: bit 3 cruce EMA, 2 tendencia, 1 RSI bajo, 0 volumen."""
+    buy_signal, is_trending, is_not_overbought, has_volume = mask & 8, mask & 4, mask & 2, mask & 1
+    if not buy_signal:
+        return False, ""
+    if not is_trending:
+        return False, "lateral"
+    if not is_not_overbought:
+        return False, "rsi_overbought"
+    return (True, "ok") if has_volume else (False, "low_volume")
+
+# Las 16 combinaciones precalculadas: _should_buy indexa en lugar de recorrer la cadena de ifs
+_DECISION_TABLE = tuple(_decision(mask) for mask in range(16))
 
 class ScalpingStrategy:
+    __slots__ = ("streamer", "md", "om", "symbol", "risk_usdt", "tp_pct", "sl_pct", "max_open_secs",
+                 "adx_threshold", "rsi_threshold", "atr_multiplier", "volume_multiplier", "logger",
+                 "trade_logger", "_min_order_value", "_in_trade", "_entry", "_qty", "_opened_at",
+                 "_last_fail_time", "_tp_price", "_stop_loss_price", "_trade_closed", "_stop",
+                 "_core")
+
     def __init__(self, streamer, order_manager, symbol: str, 
                  risk_usdt: float = 5.0, 
                  tp_pct: float = 0.003, 
@@ -32,99 +56,68 @@ class ScalpingStrategy:
         self.trade_logger = trade_logger
         
         self.logger.info("🔧 Estrategia Avanzada Configurada:")
-        self.logger.info(f"   • Riesgo por Trade: {self.risk_usdt} USDT")
-        self.logger.info(f"   • Beneficio (TP): {self.tp_pct*100:.2f}%")
-        self.logger.info(f"   • SL Dinámico: ATR x {self.atr_multiplier}")
-        self.logger.info(f"   • Filtro ADX: > {self.adx_threshold}")
-        self.logger.info(f"   • Filtro RSI: < {self.rsi_threshold}")
-        self.logger.info(f"   • Filtro Volumen: > Media x {self.volume_multiplier}")
+        self.logger.info("   • Riesgo por Trade: %s USDT", self.risk_usdt)
+        self.logger.info("   • Beneficio (TP): %.2f%%", self.tp_pct * 100)
+        self.logger.info("   • SL Dinámico: ATR x %s", self.atr_multiplier)
+        self.logger.info("   • Filtro ADX: > %s", self.adx_threshold)
+        self.logger.info("   • Filtro RSI: < %s", self.rsi_threshold)
+        self.logger.info("   • Filtro Volumen: > Media x %s", self.volume_multiplier)
 
         self._min_order_value = self.om.get_min_order_value()
         if self._min_order_value > 0:
-            self.logger.info(f"   • Mínimo de Orden: {self._min_order_value:.2f} USDT")
+            self.logger.info("   • Mínimo de Orden: %.2f USDT", self._min_order_value)
         
-        self._prices = pd.DataFrame(columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+        self._core = IndicatorCore()  # indicadores por vela y descarte de velas repetidas
         self._in_trade = False
         self._entry = 0.0
         self._qty = 0.0
         self._opened_at = 0.0
         self._last_fail_time = 0.0
+        self._tp_price = 0.0         # niveles absolutos fijados al entrar: _should_close solo compara
         self._stop_loss_price = 0.0
         self._trade_closed = False
+        self._stop = threading.Event()
 
-    def _calculate_indicators(self, df):
-        if len(df) < 25:
-            return None
-        
-        df_copy = df.copy()
-        df_copy.set_index(pd.to_datetime(df_copy['timestamp'], unit='ms'), inplace=True)
-        
-        df_copy.ta.ema(length=9, append=True)
-        df_copy.ta.ema(length=21, append=True)
-        df_copy.ta.adx(length=14, append=True)
-        df_copy.ta.rsi(length=14, append=True)
-        df_copy.ta.atr(length=14, append=True)
-        df_copy['volume_sma'] = df_copy['volume'].rolling(window=20).mean()
-        
-        return df_copy.iloc[-1]
-
-    def _should_buy(self, indicators) -> (bool, str):
-        if indicators is None or self._in_trade:
-            return False, ""
-
-        ema9, ema21 = indicators.get('EMA_9'), indicators.get('EMA_21')
-        adx, rsi = indicators.get('ADX_14'), indicators.get('RSI_14')
-        volume, volume_sma = indicators.get('volume'), indicators.get('volume_sma')
-
-        if any(v is None for v in [ema9, ema21, adx, rsi, volume, volume_sma]):
+    def _should_buy(self) -> (bool, str):
+        core = self._core
+        if self._in_trade or core.bars < _WARMUP_BARS:
             return False, ""
 
-        buy_signal = ema9 > ema21
-        is_trending = adx > self.adx_threshold
-        is_not_overbought = rsi < self.rsi_threshold
-        has_volume = volume > (volume_sma * self.volume_multiplier)
-
-        if buy_signal and is_trending and is_not_overbought:
-            if has_volume:
-                return True, "ok"
-            else:
-                return False, "low_volume"
-        
-        if buy_signal and is_trending and not is_not_overbought: return False, "rsi_overbought"
-        if buy_signal and not is_trending: return False, "lateral"
-        return False, ""
+        buy_signal = core.ema9 > core.ema21
+        is_trending = core.adx > self.adx_threshold
+        is_not_overbought = core.rsi < self.rsi_threshold
+        has_volume = core.volume > (core.vol_sma * self.volume_multiplier)
+        return _DECISION_TABLE[(buy_signal << 3) | (is_trending << 2) | (is_not_overbought << 1) | has_volume]
 
-    def _should_close(self, price: float) -> Optional[str]:
+    def _should_close(self, price: float, now: float) -> Optional[str]:
         if not self._in_trade: return None
-        if price >= self._entry * (1 + self.tp_pct): return "tp"
+        if price >= self._tp_price: return "tp"
         if price <= self._stop_loss_price: return "sl"
-        if self._opened_at and (time.time() - self._opened_at) > self.max_open_secs: return "timeout"
+        if now - self._opened_at > self.max_open_secs: return "timeout"
         return None
 
-    def on_kline(self, kline: Dict):
+    def on_kline(self, kline):
         try:
-            price = kline['close']
-            new_row = pd.DataFrame([kline])
-            self._prices = pd.concat([self._prices, new_row], ignore_index=True)
-
-            if len(self._prices) > 1000:
-                self._prices = self._prices.iloc[-1000:]
+            # Vela repetida o atrasada: ya está en el estado de los indicadores
+            if not self._core.push(kline):
+                return
 
-            indicators = self._calculate_indicators(self._prices)
+            price = kline.close
+            now = time.time()  # un único instante por vela: misma referencia en todas las comprobaciones
 
-            should_buy, reason = self._should_buy(indicators)
+            should_buy, reason = self._should_buy()
             if should_buy:
-                if time.time() - self._last_fail_time < 60: return
+                if now - self._last_fail_time < 60: return
 
                 if self.risk_usdt < self._min_order_value:
-                    self.logger.debug(f"Compra omitida. Riesgo ({self.risk_usdt} USDT) < Mínimo ({self._min_order_value} USDT).")
+                    self.logger.debug("Compra omitida. Riesgo (%s USDT) < Mínimo (%s USDT).", self.risk_usdt, self._min_order_value)
                     return
 
                 order = self.om.market_buy_usdt(self.risk_usdt)
                 
                 if order.get('retCode') != 0:
-                    self.logger.error(f"❌ Error al enviar orden: {order}")
-                    self._last_fail_time = time.time()
+                    self.logger.error("❌ Error al enviar orden: %s", order)
+                    self._last_fail_time = now
                     return
 
                 fill = self.om.last_fill(order_response=order) or {}
@@ -132,41 +125,44 @@ class ScalpingStrategy:
                 
                 if qty <= 0:
                     self.logger.warning("⚠️ Compra fallida (posible saldo insuficiente).")
-                    self._last_fail_time = time.time()
+                    self._last_fail_time = now
                     return
 
-                atr_value = indicators.get('ATRr_14', 0)
+                atr_value = self._core.atr
+                self._tp_price = lp * (1 + self.tp_pct)
                 self._stop_loss_price = lp - (atr_value * self.atr_multiplier)
 
-                self._qty, self._entry, self._opened_at, self._in_trade = qty, lp, time.time(), True
+                self._qty, self._entry, self._opened_at, self._in_trade = qty, lp, now, True
                 self._trade_closed = False
                 
-                self.logger.info("="*42)
-                self.logger.info(f"🚀 COMPRA EJECUTADA | ${lp:,.2f} | Cant: {qty}")
-                self.logger.info(f"   • SL Dinámico: ${self._stop_loss_price:,.2f} (ATR: {atr_value:.4f})")
-                self.logger.info("="*42)
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("="*42)
+                    self.logger.info("🚀 COMPRA EJECUTADA | $%s | Cant: %s", format(lp, ",.2f"), qty)
+                    self.logger.info("   • SL Dinámico: $%s (ATR: %.4f)", format(self._stop_loss_price, ",.2f"), atr_value)
+                    self.logger.info("="*42)
                 return
             
-            if reason:
-                log_messages = {
-                    "lateral": f"Mercado lateral (ADX: {indicators.get('ADX_14', 0):.2f})",
-                    "rsi_overbought": f"Sobrecompra (RSI: {indicators.get('RSI_14', 0):.2f})",
-                    "low_volume": "Bajo volumen de confirmación"
-                }
-                if reason in log_messages:
-                    self.logger.info(f"Compra rechazada: {log_messages[reason]}.")
-
-            close_reason = self._should_close(price)
+            # Puede rechazarse en cada vela: no formatear nada si INFO está filtrado
+            if reason and self.logger.isEnabledFor(logging.INFO):
+                if reason == "lateral":
+                    self.logger.info("Compra rechazada: Mercado lateral (ADX: %.2f).", self._core.adx)
+                elif reason == "rsi_overbought":
+                    self.logger.info("Compra rechazada: Sobrecompra (RSI: %.2f).", self._core.rsi)
+                elif reason == "low_volume":
+                    self.logger.info("Compra rechazada: Bajo volumen de confirmación.")
+
+            close_reason = self._should_close(price, now)
             if close_reason and not self._trade_closed:
-                self.om.market_sell(f"{self._qty:.8f}")
+                self.om.market_sell(f"{self._qty:.8f}", price_hint=price)
                 
                 pnl = (price - self._entry) * self._qty
-                result = "GANANCIA 🎉" if pnl > 0 else "PÉRDIDA ⚠️"
-                
-                self.logger.info("="*42)
-                self.logger.info(f"💰 VENTA ({close_reason.upper()}) | {result}")
-                self.logger.info(f"   • PnL: {pnl:+.2f} USDT")
-                self.logger.info("="*42)
+
+                if self.logger.isEnabledFor(logging.INFO):
+                    result = "GANANCIA 🎉" if pnl > 0 else "PÉRDIDA ⚠️"
+                    self.logger.info("="*42)
+                    self.logger.info("💰 VENTA (%s) | %s", close_reason.upper(), result)
+                    self.logger.info("   • PnL: %+.2f USDT", pnl)
+                    self.logger.info("="*42)
 
                 if self.trade_logger:
                     try:
@@ -176,17 +172,25 @@ class ScalpingStrategy:
                             self.symbol, "SELL", close_reason, price, self._qty, inv_amt, pnl, balance
                         )
                     except Exception as e:
-                        self.logger.error(f"Error al registrar trade: {e}")
+                        self.logger.error("Error al registrar trade: %s", e)
 
-                self._in_trade, self._qty, self._entry, self._opened_at, self._stop_loss_price = False, 0.0, 0.0, 0.0, 0.0
+                self._in_trade, self._qty, self._entry, self._opened_at = False, 0.0, 0.0, 0.0
+                self._tp_price, self._stop_loss_price = 0.0, 0.0
                 self._trade_closed = True
         except Exception as e:
-            self.logger.error(f"on_kline error: {e}", exc_info=True)
+            self.logger.error("on_kline error: %s", e, exc_info=True)
 
     def run(self):
+        self.om.wait_warm(timeout=2.0)
         self.md.start(on_kline=self.on_kline)
         self.logger.info("ScalpingStrategy (Avanzada) en ejecución...")
         try:
-            while True: time.sleep(1)
+            # wait() con timeout para que Ctrl+C siga llegando (en Windows un wait() sin timeout no se interrumpe)
+            while not self._stop.wait(1):
+                pass
         finally:
             self.md.stop()
+
+    def stop(self):
+        """Termina run() sin esperar al siguiente segundo."""
+        self._stop.set()
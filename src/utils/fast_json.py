@@ -0,0 +1,34 @@
+import json
+import types
+
+# orjson es opcional: si no está instalado, las librerías siguen usando el json estándar
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(s, *args, **kwargs):
+    if args or kwargs:
+        return json.loads(s, *args, **kwargs)
+    try:
+        return orjson.loads(s)
+    except orjson.JSONDecodeError:
+        # orjson rechaza entradas que el json estándar acepta (NaN, Infinity, ...): mismo resultado que antes
+        return json.loads(s)
+
+
+def install(module) -> bool:
+    """
+    Sustituye el módulo json de un módulo de terceros concreto (p.ej. pybit._websocket_stream)
+    por una copia cuyo loads va por orjson; solo afecta a ese módulo, no al resto del proceso.
+    dumps y las llamadas con argumentos extra siguen yendo al json estándar.
+    Devuelve True si se aplicó.
+    """
+    if orjson is None:
+        return False
+    shim = types.ModuleType("json")
+    shim.__dict__.update(json.__dict__)
+    shim.loads = _loads
+    setattr(module, "json", shim)
+    return True
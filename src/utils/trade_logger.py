@@ -1,53 +1,129 @@
-import csv
+import atexit
 import os
-from datetime import datetime
-from threading import Lock
+import queue
+import time
+from threading import Lock, Thread
+from src.logger import setup_logger
+
+# Cabecera tal como la escribía csv.writer (fin de línea \r\n)
+HEADER_BYTES = b"fecha,hora,cantidad de inversion,ganancia o perdida,balance actual\r\n"
+# Fila: "fecha,hora" + inversión, PnL y balance; mismo formato que csv.writer (sin comillas, \r\n)
+_LINE_FMT = "%s,%.2f,%.2f,%.2f\r\n"
+# Filas por escritura del hilo escritor como máximo (por debajo de IOV_MAX, 1024 en Linux)
+_BATCH_ROWS = 256
+# Con el disco fallando, como mucho un aviso cada este número de segundos (el resto se cuenta)
+_ERROR_REPORT_SECS = 5.0
+# Filas escritas entre sincronizaciones con el disco: acota lo que se pierde si cae la máquina
+_SYNC_EVERY_ROWS = 128
+# fdatasync no existe en Windows ni macOS: ahí fsync
+_datasync = getattr(os, "fdatasync", os.fsync)
+# writev no existe en Windows: ahí el lote se concatena y va en un único write
+_writev = getattr(os, "writev", None)
+
+
+def _write_all(fd: int, rows: list):
+    """Escribe las filas (bytes) con una sola llamada al sistema, completando si la escritura fue parcial."""
+    if _writev is not None:
+        written = _writev(fd, rows)
+        data = b"".join(rows)[written:] if written < sum(map(len, rows)) else b""
+    else:
+        data = b"".join(rows)
+    while data:
+        data = data[os.write(fd, data):]
 
 class TradeLogger:
     def __init__(self, file_path='logs/trades.csv'):
         self._file_path = file_path
+        self.logger = setup_logger(self.__class__.__name__)
         self._lock = Lock()
-        self._ensure_header()
+        # Avisos de error de escritura limitados en frecuencia (solo los usa el hilo escritor)
+        self._error_reported_at = float("-inf")
+        self._errors_suppressed = 0
+        # (segundo epoch, "AAAA-MM-DD,HH:MM:SS"): una sola asignación, segura entre hilos
+        self._sec_stamp = (-1, "")
+        # Un único descriptor en modo append durante toda la sesión, escrito solo por el hilo escritor
+        self._fd = self._open_with_header()
+        # log_trade solo formatea y encola: la E/S sale del hilo de la estrategia
+        self._queue = queue.SimpleQueue()
+        self._writer = Thread(target=self._write_loop, name="trade-logger", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
-    def _ensure_header(self):
-        """Asegura que el archivo CSV tenga la cabecera correcta."""
-        with self._lock:
-            # Crear directorio si no existe
-            os.makedirs(os.path.dirname(self._file_path), exist_ok=True)
-            
-            # Escribir cabecera si el archivo es nuevo o está vacío
-            if not os.path.exists(self._file_path) or os.path.getsize(self._file_path) == 0:
-                with open(self._file_path, 'w', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        "fecha",
-                        "hora",
-                        "cantidad de inversion",
-                        "ganancia o perdida",
-                        "balance actual"
-                    ])
+    def _open_with_header(self) -> int:
+        """
+        Abre el CSV en modo append y escribe la cabecera si está vacío.
+        La comprobación es un fstat del descriptor ya abierto: una sola llamada y sin carrera entre comprobar y abrir.
+        """
+        directory = os.path.dirname(self._file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd = os.open(self._file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        if os.fstat(fd).st_size == 0:
+            os.write(fd, HEADER_BYTES)
+        return fd
 
     def log_trade(self, symbol: str, side: str, reason: str, price: float, quantity: float, investment: float, pnl: float, final_balance: float):
         """
         Registra una operación en el archivo CSV con el formato solicitado.
+        La fila se escribe en segundo plano; close() garantiza que llegue al disco.
+        No hace E/S: los errores de escritura los gestiona el hilo escritor y nunca llegan al llamador.
         """
-        with self._lock:
+        t = int(time.time())
+        cached_t, stamp = self._sec_stamp
+        if t != cached_t:
+            stamp = time.strftime("%Y-%m-%d,%H:%M:%S", time.gmtime(t))  # fecha y hora UTC en una llamada en C
+            self._sec_stamp = (t, stamp)
+
+        self._queue.put((_LINE_FMT % (stamp, investment, pnl, final_balance)).encode())
+
+    def _write_loop(self):
+        """Hilo escritor: agrupa las filas pendientes en una sola escritura. None en la cola = terminar."""
+        q = self._queue
+        unsynced = 0
+        while True:
+            rows = [q.get()]
+            while len(rows) < _BATCH_ROWS:
+                try:
+                    rows.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in rows
+            if stop:
+                del rows[rows.index(None):]  # lo encolado tras close() ya no tiene archivo donde ir
             try:
-                now = datetime.utcnow()
-                fecha = now.strftime('%Y-%m-%d')
-                hora = now.strftime('%H:%M:%S')
-                
-                with open(self._file_path, 'a', newline='') as f:
-                    writer = csv.writer(f)
-                    writer.writerow([
-                        fecha,
-                        hora,
-                        f"{investment:.2f}",
-                        f"{pnl:.2f}",
-                        f"{final_balance:.2f}"
-                    ])
+                if rows:
+                    # Sin buffer en el proceso: cada lote llega al sistema operativo enseguida;
+                    # el paso a disco (fdatasync) se hace cada _SYNC_EVERY_ROWS filas y al cerrar
+                    _write_all(self._fd, rows)
+                    unsynced += len(rows)
+                if unsynced and (stop or unsynced >= _SYNC_EVERY_ROWS):
+                    _datasync(self._fd)
+                    unsynced = 0
             except IOError as e:
-                print(f"Error al escribir en el log de trades: {e}")
+                self._report_write_error(e)
+            if stop:
+                return
+
+    def _report_write_error(self, error):
+        """Avisa por el logger (cola, nunca bloquea en stdout) como mucho una vez cada _ERROR_REPORT_SECS."""
+        now = time.monotonic()
+        if now - self._error_reported_at < _ERROR_REPORT_SECS:
+            self._errors_suppressed += 1
+            return
+        self.logger.warning("Error al escribir en el log de trades (%d avisos omitidos): %s",
+                            self._errors_suppressed, error)
+        self._error_reported_at = now
+        self._errors_suppressed = 0
+
+    def close(self):
+        """Escribe las filas pendientes y cierra el archivo."""
+        with self._lock:
+            if self._fd is None:
+                return
+            self._queue.put(None)
+            self._writer.join()
+            os.close(self._fd)
+            self._fd = None
 
 # Ejemplo de uso (esto no se ejecutará directamente)
 if __name__ == '__main__':
@@ -77,3 +153,4 @@ if __name__ == '__main__':
         pnl=-0.35,
         final_balance=99.86
     )
+    logger.close()
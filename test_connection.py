@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 from pybit.unified_trading import HTTP
 import os
 from dotenv import load_dotenv
@@ -17,38 +18,38 @@ if not api_key or not api_secret:
 
 print(f"🔑 Clave detectada: {api_key[:4]}...{api_key[-4:]}")
 
-# ---------------------------------------------------------
-# PRUEBA 1: TESTNET
-# ---------------------------------------------------------
-print("\n📡 1. Intentando conectar a TESTNET (Dinero Ficticio)...")
-try:
-    session = HTTP(testnet=True, api_key=api_key, api_secret=api_secret)
-    resp = session.get_wallet_balance(accountType="UNIFIED", coin="USDT")
-    
-    if resp.get("retCode") == 0:
-        print("✅ ¡ÉXITO! Esta API Key es de TESTNET.")
-        balance = resp['result']['list'][0]['coin'][0]['walletBalance']
-        print(f"💰 Balance: {balance} USDT")
-    else:
-        print(f"❌ No es Testnet. Mensaje: {resp.get('retMsg')}")
-except Exception as e:
-    print(f"❌ Error técnico en Testnet: {e}")
-
-# ---------------------------------------------------------
-# PRUEBA 2: MAINNET (PRODUCCIÓN)
-# ---------------------------------------------------------
-print("\n📡 2. Intentando conectar a MAINNET (Dinero Real)...")
-try:
-    session = HTTP(testnet=False, api_key=api_key, api_secret=api_secret)
-    resp = session.get_wallet_balance(accountType="UNIFIED", coin="USDT")
-    
-    if resp.get("retCode") == 0:
-        print("✅ ¡ÉXITO! Esta API Key es de PRODUCCIÓN (REAL).")
-        balance = resp['result']['list'][0]['coin'][0]['walletBalance']
-        print(f"💰 Balance: {balance} USDT")
-    else:
-        print(f"❌ No es Producción. Mensaje: {resp.get('retMsg')}")
-except Exception as e:
-    print(f"❌ Error técnico en Producción: {e}")
+testnet_session = HTTP(testnet=True, api_key=api_key, api_secret=api_secret)
+mainnet_session = HTTP(testnet=False, api_key=api_key, api_secret=api_secret)
+
+
+def probe(session, label: str, env_name: str):
+    """Consulta el balance USDT con la sesión dada y devuelve las líneas del resultado."""
+    try:
+        resp = session.get_wallet_balance(accountType="UNIFIED", coin="USDT")
+
+        if resp.get("retCode") == 0:
+            balance = resp['result']['list'][0]['coin'][0]['walletBalance']
+            return [f"✅ ¡ÉXITO! Esta API Key es de {label}.", f"💰 Balance: {balance} USDT"]
+        return [f"❌ No es {env_name}. Mensaje: {resp.get('retMsg')}"]
+    except Exception as e:
+        return [f"❌ Error técnico en {env_name}: {e}"]
+
+
+# Las dos pruebas van a hosts distintos (cada una con su sesión): se lanzan en paralelo y se imprimen en orden
+with ThreadPoolExecutor(max_workers=2) as pool:
+    testnet_result = pool.submit(probe, testnet_session, "TESTNET", "Testnet")
+    mainnet_result = pool.submit(probe, mainnet_session, "PRODUCCIÓN (REAL)", "Producción")
+
+    # ---------------------------------------------------------
+    # PRUEBA 1: TESTNET
+    # ---------------------------------------------------------
+    print("\n📡 1. Intentando conectar a TESTNET (Dinero Ficticio)...")
+    print("\n".join(testnet_result.result()))
+
+    # ---------------------------------------------------------
+    # PRUEBA 2: MAINNET (PRODUCCIÓN)
+    # ---------------------------------------------------------
+    print("\n📡 2. Intentando conectar a MAINNET (Dinero Real)...")
+    print("\n".join(mainnet_result.result()))
 
 print("\n---------------------------------------------------------")